@@ -0,0 +1,155 @@
+"""Briefing packs for many publishers in one run
+
+    python -m briefbuilder.batch [--start-date 2024-01-01] [--end-date 2024-06-30]
+                                 [--publishers Bbc Guardian ...] [--topics Politics ...]
+                                 [--out packs/] [--workers 4]
+
+Publishers, topics and dates default to everything in the database. The corpus is loaded
+once, and the statistics cube and chart builder built from it are shared by every pack.
+Packs are generated in a pool of worker processes, each comparing its publisher against
+all other publishers of the batch, and written to one PPTX file per publisher.
+"""
+import os
+import re
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.query import (initialize_parameter_query,
+                         build_query,
+                         execute_query_to_dataframe,
+                         load_topic_bridge,
+                         export_query_params_to_json,
+                         STAGE_COLUMNS)
+from data_generator.cube import StatsCube
+from data_generator.charts import ChartBuilder
+from data_generator.render import ChartRenderService
+from briefbuilder.components import ReportComponentFactory
+from briefbuilder.pack import assemble_pack, TEMPLATE_PATH
+from prs_generator.template import template_cache
+from utils.artifacts import create_artifact_store
+
+PACK_STAGES = ['components', 'slides']
+
+# Corpus and chart builder of a worker process, set once by _init_worker
+_worker = dict()
+
+
+def load_corpus(publishers, start_date, end_date, topics):
+    """Load the report dataset of all publishers and build its statistics cube"""
+    sql = build_query(publishers[0], start_date, end_date, publishers[1:], [], topics,
+                      columns=STAGE_COLUMNS['report'])
+    query_data = execute_query_to_dataframe(sql)
+    topic_bridge = load_topic_bridge(sql)
+    cube = StatsCube(query_data, topic_bridge)
+    return query_data, topic_bridge, cube
+
+
+def _init_worker(query_data, topic_bridge, cube, template_path):
+    _worker['query_data'] = query_data
+    _worker['topic_bridge'] = topic_bridge
+    _worker['cube'] = cube
+    _worker['template_path'] = template_path
+    template_cache.load(template_path)
+    _worker['chart_builder'] = ChartBuilder()
+    # Packs are already built in parallel, charts are rendered in the worker itself
+    _worker['chart_renderer'] = ChartRenderService(_worker['chart_builder'], workers=0)
+
+
+def pack_filename(publisher, start_date, end_date):
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', publisher).strip('_')
+    return f'briefing_pack_{slug}_{start_date}_{end_date}.pptx'
+
+
+def build_pack(publisher, publishers, start_date, end_date, topics, out_dir):
+    """Build and save the pack of one publisher, returns its path and stage timings"""
+    compared_publishers = [p for p in publishers if p != publisher]
+    query_params = export_query_params_to_json(publisher, start_date, end_date, compared_publishers, [], topics)
+    output = os.path.join(out_dir, pack_filename(publisher, start_date, end_date))
+    timings = dict()
+
+    start = time.perf_counter()
+    rcf = ReportComponentFactory(query_params,
+                                 _worker['query_data'],
+                                 _worker['topic_bridge'],
+                                 _worker['cube'],
+                                 _worker['chart_builder'],
+                                 create_artifact_store(),
+                                 _worker['chart_renderer'])
+    rcf.run()
+    timings['components'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assemble_pack(rcf.results, start_date, end_date, output, _worker['template_path'], rcf.artifact_store)
+    timings['slides'] = time.perf_counter() - start
+    rcf.artifact_store.close()
+
+    return publisher, output, timings
+
+
+def run_batch(publishers, start_date, end_date, topics, out_dir, workers=None, template_path=TEMPLATE_PATH):
+    """Generate one pack per publisher and print a throughput report"""
+    if len(publishers) < 2:
+        raise ValueError('Packs compare each publisher against the others, at least two publishers are needed')
+
+    # A template that does not fit the slides fails before any work is done
+    template_cache.load(template_path)
+    os.makedirs(out_dir, exist_ok=True)
+    if workers is None:
+        workers = min(len(publishers), os.cpu_count() or 1)
+
+    start = time.perf_counter()
+    query_data, topic_bridge, cube = load_corpus(publishers, start_date, end_date, topics)
+    load_time = time.perf_counter() - start
+    print(f'Loaded {len(query_data)} rows for {len(publishers)} publishers in {load_time:.2f}s')
+
+    results = []
+    start = time.perf_counter()
+    if workers <= 1:
+        _init_worker(query_data, topic_bridge, cube, template_path)
+        for publisher in publishers:
+            results.append(build_pack(publisher, publishers, start_date, end_date, topics, out_dir))
+            print(f'{results[-1][0]}: {results[-1][1]}')
+    else:
+        # Spawned workers open their own database connections instead of inheriting ours
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(query_data, topic_bridge, cube, template_path)) as executor:
+            futures = [executor.submit(build_pack, publisher, publishers, start_date, end_date, topics, out_dir)
+                       for publisher in publishers]
+            for future in as_completed(futures):
+                results.append(future.result())
+                print(f'{results[-1][0]}: {results[-1][1]}')
+    elapsed = time.perf_counter() - start
+
+    packs_per_minute = len(results) / elapsed * 60 if elapsed > 0 else float('inf')
+    print(f'{len(results)} packs in {elapsed:.2f}s with {max(workers, 1)} worker(s): {packs_per_minute:.1f} packs/minute')
+    if len(results) > 0:
+        stage_means = ', '.join(
+            f'{stage} {sum(r[2][stage] for r in results) / len(results):.2f}s' for stage in PACK_STAGES
+        )
+        print(f'Per pack: load {load_time / len(results):.2f}s (shared), {stage_means}')
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a briefing pack for every publisher')
+    parser.add_argument('--publishers', nargs='+', help='Publishers to generate packs for (default: all)')
+    parser.add_argument('--topics', nargs='+', help='Topics to cover (default: all)')
+    parser.add_argument('--start-date', help='First publication date, YYYY-MM-DD (default: earliest article)')
+    parser.add_argument('--end-date', help='Last publication date, YYYY-MM-DD (default: latest article)')
+    parser.add_argument('--out', default='packs', help='Output directory for the PPTX files')
+    parser.add_argument('--workers', type=int, help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--template', default=TEMPLATE_PATH, help='PPTX template')
+    args = parser.parse_args()
+
+    constraints = initialize_parameter_query()
+    publishers = args.publishers or constraints['publishers']
+    topics = args.topics or constraints['topics']
+    start_date = args.start_date or constraints['date_range'][0].strftime('%Y-%m-%d')
+    end_date = args.end_date or constraints['date_range'][1].strftime('%Y-%m-%d')
+
+    run_batch(publishers, start_date, end_date, topics, args.out, args.workers, args.template)
@@ -1,74 +1,258 @@
 import os
 import re
-import shutil
+import json
+import hashlib
 from datetime import datetime
 import pandas as pd
 
 from llm_generator.generator import Generator
 from llm_generator.fr_generator import FixedResponseGenerator
+from llm_generator.prompt.exceptions import PromptError
 from data_generator.statistics import StatsCalculator
 from data_generator.charts import ChartBuilder
+from data_generator.render import ChartRenderService, render_service
+from data_generator.chart_cache import CHART_CODE_VERSION
+from utils.artifacts import create_artifact_store
+from utils.case_studies import CASE_TYPE_COLUMNS, restructure_analysis
+from utils.query import fetch_analysis_text, fetch_case_study_summaries
+
+# 'image' renders charts to PNG for the slides, 'native' only keeps their chart data, which
+# Prs draws as PowerPoint charts
+CHART_MODE = os.getenv('CHART_MODE', 'image')
 
 class ReportComponentFactory:
 
-    def __init__(self, query_params, query_data):
+    def __init__(self, query_params, query_data, topic_bridge=None, cube=None, chart_builder=None, artifact_store=None,
+                 chart_renderer=None):
         self.query_data = self.__typecast_categorical_columns(query_data)
-        self.stats      = StatsCalculator(query_params, self.query_data)
+        self.stats      = StatsCalculator(query_params, self.query_data, topic_bridge, cube)
         self.llm_gen    = Generator(query_params, self.query_data)
         self.fr_gen     = FixedResponseGenerator(query_params, self.query_data)
         self.results    = dict()
+        self.query_params = query_params
+
+        # Schema and input fingerprint of every component after run(), by component name,
+        # and the names of the components run() actually built
+        self.component_states = dict()
+        self.rebuilt = []
+
+        # Charts of this report only, so concurrent reports do not overwrite each other's
+        if artifact_store is None:
+            artifact_store = create_artifact_store()
+        self.artifact_store = artifact_store
+
+        # One chart builder (and theme) for all charts of the report
+        if chart_builder is None:
+            chart_builder = ChartBuilder()
+        self.chart_builder = chart_builder
+
+        # Charts are rendered in the background by the process-wide render service
+        if chart_renderer is None:
+            chart_renderer = render_service
+        self.chart_renderer = chart_renderer
         self.__initialize_components()
 
     def __initialize_components(self):
         self.component_report_parameters = ReportParametersComponent(self.stats, self.fr_gen)
         self.component_case_studies      = CaseStudyComponent(self.stats, self.fr_gen)
-        self.component_pub_performance   = PublisherPerformanceComponent_withFixedResponses(self.stats, self.fr_gen)
-        self.component_pub_comparison    = PubisherComparisonComponent_withFixedResponses(self.stats, self.fr_gen)
+        self.component_pub_performance   = PublisherPerformanceComponent_withFixedResponses(self.stats, self.fr_gen,
+                                                                                           self.chart_builder, self.artifact_store,
+                                                                                           self.chart_renderer)
+        self.component_pub_comparison    = PubisherComparisonComponent_withFixedResponses(self.stats, self.fr_gen,
+                                                                                          self.chart_builder, self.artifact_store,
+                                                                                          self.chart_renderer)
         self.component_conclusions       = ConclusionsComponent(self.stats, self.llm_gen)
         self.component_key_findings      = KeyFindingsComponent(self.stats, self.llm_gen)
 
+        # In build order
+        self.components = [
+            self.component_report_parameters,
+            self.component_case_studies,
+            self.component_pub_performance,
+            self.component_pub_comparison,
+            self.component_conclusions,
+            self.component_key_findings
+        ]
+
     def __typecast_categorical_columns(self, query_data):
         """Turn query dataset into categorical type"""
 
-        query_data['negative_aspects_score']    = pd.Categorical(query_data.negative_aspects_score, ordered=True, categories=['NA', 'Very Low', 'Low', 'Medium', 'High', 'Very High'])
-        query_data['generalisation_score']      = pd.Categorical(query_data.generalisation_score, ordered=True, categories=['NA', 'Very Low', 'Low', 'Medium', 'High', 'Very High'])
-        query_data['omit_due_prominence_score'] = pd.Categorical(query_data.omit_due_prominence_score, ordered=True, categories=['NA', 'Very Low', 'Low', 'Medium', 'High', 'Very High'])
-        query_data['headline_bias_score']       = pd.Categorical(query_data.headline_bias_score, ordered=True, categories=['NA', 'Very Low', 'Low', 'Medium', 'High', 'Very High'])
-        query_data['misrepresentation_score']   = pd.Categorical(query_data.misrepresentation_score, ordered=True, categories=['NA', 'Very Low', 'Low', 'Medium', 'High', 'Very High'])
+        score_type = pd.CategoricalDtype(ordered=True, categories=['NA', 'Very Low', 'Low', 'Medium', 'High', 'Very High'])
+        score_columns = ['negative_aspects_score', 'generalisation_score', 'omit_due_prominence_score',
+                         'headline_bias_score', 'misrepresentation_score']
+
+        # Typed loads already return these as categoricals
+        for column in score_columns:
+            if query_data[column].dtype != score_type:
+                query_data[column] = pd.Categorical(query_data[column], dtype=score_type)
         
         return query_data
 
-    def __make_chart_tmp_folder(self):
-        if not os.path.exists('tmp'):
-            os.mkdir('tmp')
-        else:
-            shutil.rmtree('tmp')
-            os.mkdir('tmp')
-
-    def run(self):
-        self.__make_chart_tmp_folder()
-        self.build_component(self.component_report_parameters)
-        self.build_component(self.component_case_studies)
-        self.build_component(self.component_pub_performance)
-        self.build_component(self.component_pub_comparison)
-        self.build_component(self.component_conclusions)
-        self.build_component(self.component_key_findings)
+    def __prefetch_llm_text(self, components):
+        """Send the LLM prompts of the components concurrently, before building them one by one"""
+        requests = []
+        for component in components:
+            requests += component.llm_requests([name for name, _, _ in requests])
+
+        if len(requests) > 0:
+            # Answered while the components are built and their charts rendered
+            self.llm_gen.prefetch_in_background(requests)
+
+    def __save_charts(self):
+        for component in self.components:
+            component.save_charts()
+
+    def __data_fingerprint(self):
+        h = hashlib.sha256()
+        h.update(json.dumps(self.query_params, sort_keys=True, default=str).encode('utf-8'))
+        h.update(repr((list(self.query_data.columns), self.query_data.dtypes.astype(str).tolist())).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(self.query_data, index=True).to_numpy().tobytes())
+        return h.hexdigest()
+
+    def input_fingerprints(self):
+        """Fingerprint of everything each component is built from, by component name"""
+        data_fingerprint = self.__data_fingerprint()
+        fingerprints = dict()
+        for component in self.components:
+            h = hashlib.sha256(data_fingerprint.encode('utf-8'))
+            h.update(json.dumps(component.inputs(), sort_keys=True, default=str).encode('utf-8'))
+            if component.summarizes_earlier_components():
+                # Built from the turns of the components before it, so it changes with them
+                for fingerprint in fingerprints.values():
+                    h.update(fingerprint.encode('utf-8'))
+            fingerprints[component.component_name] = h.hexdigest()
+        return fingerprints
+
+    def run(self, previous_states=None, previous_artifacts=None, rebuild=()):
+        """Build all components, or only the changed ones given the states of an earlier run
+
+        previous_states are the component_states of an earlier run and previous_artifacts
+        the artifact store holding its charts. Components whose input fingerprint is
+        unchanged reuse their earlier schema and charts, those named in rebuild are
+        built again regardless, e.g. to draw other case studies.
+        """
+        if previous_states is None:
+            previous_states = dict()
+        fingerprints = self.input_fingerprints()
+
+        changed = []
+        for component in self.components:
+            previous = previous_states.get(component.component_name)
+            if (previous is None or previous['fingerprint'] != fingerprints[component.component_name]
+                    or component.component_name in rebuild or previous_artifacts is None):
+                changed.append(component)
+        self.rebuilt = [component.component_name for component in changed]
+
+        self.__prefetch_llm_text(changed)
+        for component in self.components:
+            if component in changed:
+                self.build_component(component)
+            else:
+                self.restore_component(component, previous_states[component.component_name]['schema'], previous_artifacts)
+            self.component_states[component.component_name] = {
+                'fingerprint': fingerprints[component.component_name],
+                'schema': component.schema
+            }
+        self.__save_charts()
     
     def build_component(self, component_object):
         component_object.build()
         self.results.update(component_object.schema)
 
+    def restore_component(self, component_object, schema, artifact_store):
+        component_object.restore(schema, artifact_store)
+        self.results.update(component_object.schema)
+
 
 class Component:
 
-    def __init__(self, statistics_object, generator_object):
+    def __init__(self, statistics_object, generator_object, chart_builder=None, artifact_store=None, chart_renderer=None):
         self.stat = statistics_object
         self.gen = generator_object
+        self.chart_builder = chart_builder
+        self.artifact_store = artifact_store
+        self.chart_renderer = chart_renderer
+        self.chart_mode = CHART_MODE
         self.component_name = None
         self.schema = dict()
 
+        # Charts being rendered, by file path
+        self.charts = dict()
+
     def _chart_factory(self):
+        if self.chart_builder is not None:
+            return self.chart_builder
         return ChartBuilder()
+
+    def _chart_filepath(self, subsection):
+        """Artifact name of the subsection's chart"""
+        return f'{subsection}.png'
+
+    def _build_chart(self, subsection, method, *args):
+        """Chart of a subsection from chart_builder.<method>(*args)
+
+        Returns the artifact name of the rendered PNG and None if CHART_MODE is 'image',
+        else '' and the chart data for a native PowerPoint chart.
+        """
+        if self.chart_mode == 'image':
+            chart_filepath = self._chart_filepath(subsection)
+            self._render_chart(chart_filepath, method, *args)
+            return chart_filepath, None
+
+        return '', getattr(self._chart_factory(), f'{method}_data')(*args)
+
+    def _render_chart(self, chart_filepath, method, *args):
+        """Start rendering chart_builder.<method>(*args), save_charts() stores it as chart_filepath"""
+        if self.chart_renderer is None:
+            # Render right away with the component's own chart builder
+            self.chart_renderer = ChartRenderService(self._chart_factory(), workers=0)
+        self.charts[chart_filepath] = self.chart_renderer.submit(method, *args)
+
+    def save_charts(self):
+        """Wait for the charts being rendered and put them in the artifact store"""
+        if self.artifact_store is None:
+            self.artifact_store = create_artifact_store()
+        for chart_filepath, future in self.charts.items():
+            self.artifact_store.put(chart_filepath, future.result())
+        self.charts = dict()
+
+    def inputs(self):
+        """Settings the schema depends on besides the query params and data of the report
+
+        Part of the input fingerprint used by ReportComponentFactory.run() to skip
+        components that would be built the same way again.
+        """
+        inputs = {'component': type(self).__name__, 'generator': type(self.gen).__name__}
+        if isinstance(self.gen, Generator):
+            inputs['model'] = self.gen.api_handler.model
+            # Prompt templates as filled in, so edits to a template are noticed
+            prompts = [prompt for _, prompt, _ in self.llm_requests([])]
+            inputs['prompts'] = hashlib.sha256(json.dumps(prompts).encode('utf-8')).hexdigest()
+        if self.chart_builder is not None:
+            inputs['chart_mode'] = self.chart_mode
+            inputs['chart_code_version'] = CHART_CODE_VERSION
+        return inputs
+
+    def summarizes_earlier_components(self):
+        """Whether the schema is built from the output of the components built before this one"""
+        return False
+
+    def restore(self, schema, artifact_store):
+        """Take over the schema of an earlier build, with its charts from artifact_store"""
+        self.schema = schema
+        if self.artifact_store is None:
+            self.artifact_store = create_artifact_store()
+        for subschema in schema.get(self.component_name, dict()).values():
+            if isinstance(subschema, dict) and subschema.get('chart_filepath', '') != '':
+                self.artifact_store.put(subschema['chart_filepath'], artifact_store.get(subschema['chart_filepath']))
+
+    def llm_requests(self, earlier_requests):
+        """Prompts the component will send to the LLM while building, as (name, prompt, depends_on)
+
+        earlier_requests are the names of the requests of the components built before
+        this one. The factory sends all requests concurrently ahead of building.
+        """
+        return []
     
     def _parse_response(self, llm_response):
         # pattern = re.compile(r"""\[(.*?)\]\s*([\s\-A-Za-z0-9\.,\'’.%\"+]+)\s*""")
@@ -90,6 +274,8 @@ class MethodologyComponent(Component):
         self.component_name = 'Methodology'
         self.schema = dict()
 
+    def llm_requests(self, earlier_requests):
+        return [self.gen.methodology_request()]
 
     def create_text(self):
         text = self.gen.generate_methodology()
@@ -148,6 +334,20 @@ class KeyFindingsComponent(Component):
         self.component_name = 'Key Findings'
         self.schema = dict()
 
+        # Text generation is switched off, the slide is left for the editor to fill in
+        self.with_text = False
+
+    def inputs(self):
+        return dict(super().inputs(), with_text=self.with_text)
+
+    def summarizes_earlier_components(self):
+        return self.with_text
+
+    def llm_requests(self, earlier_requests):
+        if not self.with_text:
+            return []
+        # Summarizes the earlier turns of the conversation
+        return [self.gen.key_message_request(earlier_requests)]
 
     def create_text(self):
         text = self.gen.generate_key_message()
@@ -163,7 +363,8 @@ class KeyFindingsComponent(Component):
         }
 
     def build(self):
-        # self.create_text()
+        if self.with_text:
+            self.create_text()
         self.consolidate_to_schema()
 
 
@@ -174,6 +375,20 @@ class ConclusionsComponent(Component):
         self.component_name = 'Conclusions'
         self.schema = dict()
 
+        # Text generation is switched off, the slide is left for the editor to fill in
+        self.with_text = False
+
+    def inputs(self):
+        return dict(super().inputs(), with_text=self.with_text)
+
+    def summarizes_earlier_components(self):
+        return self.with_text
+
+    def llm_requests(self, earlier_requests):
+        if not self.with_text:
+            return []
+        # Summarizes the earlier turns of the conversation
+        return [self.gen.conclusions_request(earlier_requests)]
 
     def create_text(self):
         text = self.gen.generate_conclusions()
@@ -189,22 +404,20 @@ class ConclusionsComponent(Component):
         }
 
     def build(self):
-        # self.create_text()
+        if self.with_text:
+            self.create_text()
         self.consolidate_to_schema()
 
 
 class PublisherPerformanceComponent_withFixedResponses(Component):
-    def __init__(self, statistics_object, generator_object):
-        super().__init__(statistics_object, generator_object)
+    def __init__(self, statistics_object, generator_object, chart_builder=None, artifact_store=None, chart_renderer=None):
+        super().__init__(statistics_object, generator_object, chart_builder, artifact_store, chart_renderer)
         self.component_name = 'Publisher Performance Overview'
         self.valid_subsections = ['bias_rating', 'bias_category', 'bias_rating_vs_topics', 'bias_category_vs_topics']
         self.schema = dict()
 
     def create_subsection(self, subsection):
-        chart = super()._chart_factory()
-
         if subsection in self.valid_subsections:
-            chart_filepath = f'tmp/{subsection}.png'
 
             if subsection in ['bias_rating', 'bias_category']:
 
@@ -215,24 +428,24 @@ class PublisherPerformanceComponent_withFixedResponses(Component):
                     data = self.stat.calc_1D_biased_stats(subsection)
                 
                 chart_title = self.gen.generate_analysis(analysis_type=subsection, data=data)
-                chart.build_bar_chart(data, subsection).save(chart_filepath)
+                chart_filepath, chart_data = super()._build_chart(subsection, 'build_bar_chart', data, subsection)
 
             elif subsection in ['bias_rating_vs_topics', 'bias_category_vs_topics']:
                 param = subsection.strip('_vs_topics')
                 data = self.stat.calc_2D_biased_stats('topic', param)
                 chart_title = self.gen.generate_analysis(analysis_type=subsection, data=data)
-                chart.build_heatmap_chart(data, 'topic', param).save(chart_filepath)
+                chart_filepath, chart_data = super()._build_chart(subsection, 'build_heatmap_chart', data, 'topic', param)
 
             else:
                 raise ValueError()
             
-            subschema = self.consolidate_to_subschema(subsection, chart_filepath, chart_title, [''])
+            subschema = self.consolidate_to_subschema(subsection, chart_filepath, chart_title, [''], chart_data)
             return subschema
         
         else:
             raise ValueError('invalid subsection')
         
-    def consolidate_to_subschema(self, subsection, chart_filepath, chart_title, bullets):
+    def consolidate_to_subschema(self, subsection, chart_filepath, chart_title, bullets, chart_data=None):
         title_dict = {
             'bias_rating': "Distribution of Bias Ratings", 
             'bias_category': "Distribution of Bias Categories",
@@ -245,6 +458,7 @@ class PublisherPerformanceComponent_withFixedResponses(Component):
                 'title': title_dict[subsection],
                 'chart_title': chart_title,
                 'chart_filepath': chart_filepath,
+                'chart_data': chart_data,
                 'bullets': bullets[0]
             }
         }
@@ -260,31 +474,28 @@ class PublisherPerformanceComponent_withFixedResponses(Component):
 
 class PubisherComparisonComponent_withFixedResponses(Component):
 
-    def __init__(self, statistics_object, generator_object):
-        super().__init__(statistics_object, generator_object)
+    def __init__(self, statistics_object, generator_object, chart_builder=None, artifact_store=None, chart_renderer=None):
+        super().__init__(statistics_object, generator_object, chart_builder, artifact_store, chart_renderer)
         self.component_name = 'Publisher Comparison'
         self.valid_subsections = ['bias_rating_comparison', 'bias_category_comparison']
         
         self.schema = dict()
 
     def create_subsection(self, subsection):
-        chart = super()._chart_factory()
-
         if subsection in self.valid_subsections:
-            chart_filepath = f'tmp/{subsection}.png'
 
             param = subsection.removesuffix('_comparison')
             data = self.stat.calc_1D_stats(param, include_compared_publishers=True)
             chart_title = self.gen.generate_analysis(analysis_type=subsection, data=data)
-            chart.build_stacked_bar_chart(data, param).save(chart_filepath)
+            chart_filepath, chart_data = super()._build_chart(subsection, 'build_stacked_bar_chart', data, param)
         
-            subschema = self.consolidate_to_subschema(subsection, chart_filepath, chart_title, [''])
+            subschema = self.consolidate_to_subschema(subsection, chart_filepath, chart_title, [''], chart_data)
             return subschema
         
         else:
             raise ValueError('invalid subsection')
         
-    def consolidate_to_subschema(self, subsection, chart_filepath, chart_title, bullets):
+    def consolidate_to_subschema(self, subsection, chart_filepath, chart_title, bullets, chart_data=None):
         title_dict = {
             'bias_rating_comparison': "Bias Rating Comparison",
             'bias_category_comparison': "Bias Category Comparison"
@@ -295,6 +506,7 @@ class PubisherComparisonComponent_withFixedResponses(Component):
                 'title': title_dict[subsection],
                 'chart_title': chart_title,
                 'chart_filepath': chart_filepath,
+                'chart_data': chart_data,
                 'bullets': bullets[0]
             }
         }
@@ -307,47 +519,59 @@ class PubisherComparisonComponent_withFixedResponses(Component):
 
 class PublisherPerformanceComponent(Component):
 
-    def __init__(self, statistics_object, generator_object):
-        super().__init__(statistics_object, generator_object)
+    def __init__(self, statistics_object, generator_object, chart_builder=None, artifact_store=None, chart_renderer=None):
+        super().__init__(statistics_object, generator_object, chart_builder, artifact_store, chart_renderer)
         self.component_name = 'Publisher Performance Overview'
         self.valid_subsections = ['bias_rating', 'bias_category', 'bias_rating_vs_topics', 'bias_category_vs_topics']
         self.schema = dict()
     
-    def create_subsection(self, subsection):
-        chart = super()._chart_factory()
-
-        if subsection in self.valid_subsections:
-            chart_filepath = f'tmp/{subsection}.png'
+    def __analysis_input(self, subsection):
+        """Analysis type and data of the subsection's LLM analysis"""
+        if subsection in ['topic', 'bias_rating', 'bias_category']:
+
+            # Use 2D biased stats functions if doing analysis by category
+            if subsection == 'bias_rating':
+                data = self.stat.calc_1D_stats(subsection) 
+            else:   
+                data = self.stat.calc_1D_biased_stats(subsection)
+            return subsection, data
+
+        elif subsection in ['bias_rating_vs_topics', 'bias_category_vs_topics']:
+            param = subsection.strip('_vs_topics')
+            data = self.stat.calc_2D_biased_stats(param)
+            return param, data
 
-            if subsection in ['topic', 'bias_rating', 'bias_category']:
+        else:
+            raise ValueError()
 
-                # Use 2D biased stats functions if doing analysis by category
-                if subsection == 'bias_rating':
-                    data = self.stat.calc_1D_stats(subsection) 
-                else:   
-                    data = self.stat.calc_1D_biased_stats(subsection)
-                
-                text = self.gen.generate_analysis(analysis_type=subsection, data=data)
-                chart.build_bar_chart(data, subsection).save(chart_filepath)
+    def llm_requests(self, earlier_requests):
+        # The prompts ask to draw on the articles seen so far, i.e. the case study turns
+        case_studies = [name for name in earlier_requests if name.startswith('case_study:')]
+        requests = []
+        for subsection in self.valid_subsections:
+            analysis_type, data = self.__analysis_input(subsection)
+            requests.append(self.gen.analysis_request(f'analysis:{subsection}', analysis_type, data, case_studies))
+        return requests
 
-            elif subsection in ['bias_rating_vs_topics', 'bias_category_vs_topics']:
-                param = subsection.strip('_vs_topics')
-                data = self.stat.calc_2D_biased_stats(param)
-                text = self.gen.generate_analysis(analysis_type=param, data=data)
-                chart.build_heatmap_chart(data, param).save(chart_filepath)
+    def create_subsection(self, subsection):
+        if subsection in self.valid_subsections:
+            analysis_type, data = self.__analysis_input(subsection)
+            text = self.gen.generate_analysis(analysis_type=analysis_type, data=data)
 
+            if subsection in ['topic', 'bias_rating', 'bias_category']:
+                chart_filepath, chart_data = super()._build_chart(subsection, 'build_bar_chart', data, subsection)
             else:
-                raise ValueError()
+                chart_filepath, chart_data = super()._build_chart(subsection, 'build_heatmap_chart', data, analysis_type)
             
             chart_title, bullets = super()._parse_response(text)
         
-            subschema = self.consolidate_to_subschema(subsection, chart_filepath, chart_title, bullets)
+            subschema = self.consolidate_to_subschema(subsection, chart_filepath, chart_title, bullets, chart_data)
             return subschema
         
         else:
             raise ValueError('invalid subsection')
 
-    def consolidate_to_subschema(self, subsection, chart_filepath, chart_title, bullets):
+    def consolidate_to_subschema(self, subsection, chart_filepath, chart_title, bullets, chart_data=None):
         title_dict = {
             'topic': "Topic Coverage for All Publication",
             'bias_rating': "Distribution of Bias Ratings", 
@@ -361,6 +585,7 @@ class PublisherPerformanceComponent(Component):
                 'title': title_dict[subsection],
                 'chart_title': chart_title[0],
                 'chart_filepath': chart_filepath,
+                'chart_data': chart_data,
                 'bullets': bullets[0]
             }
         }
@@ -375,33 +600,39 @@ class PublisherPerformanceComponent(Component):
 
 class PubisherComparisonComponent(Component):
 
-    def __init__(self, statistics_object, generator_object):
-        super().__init__(statistics_object, generator_object)
+    def __init__(self, statistics_object, generator_object, chart_builder=None, artifact_store=None, chart_renderer=None):
+        super().__init__(statistics_object, generator_object, chart_builder, artifact_store, chart_renderer)
         self.component_name = 'Publisher Comparison'
         self.valid_subsections = ['tendency_bias_rating', 'tendency_bias_category']
         
         self.schema = dict()
 
-    def create_subsection(self, subsection):
-        chart = super()._chart_factory()
+    def llm_requests(self, earlier_requests):
+        # The prompts ask to draw on the articles seen so far, i.e. the case study turns
+        case_studies = [name for name in earlier_requests if name.startswith('case_study:')]
+        requests = []
+        for subsection in self.valid_subsections:
+            data = self.stat.calc_tendency(subsection.removeprefix('tendency_'))
+            requests.append(self.gen.analysis_request(f'analysis:{subsection}', 'tendency', data, case_studies))
+        return requests
 
+    def create_subsection(self, subsection):
         if subsection in self.valid_subsections:
-            chart_filepath = f'tmp/{subsection}.png'
 
             param = subsection.removeprefix('tendency_')
             data = self.stat.calc_tendency(param)
             text = self.gen.generate_analysis(analysis_type='tendency', data=data)
-            chart.build_odds_chart(data, param).save(chart_filepath)
+            chart_filepath, chart_data = super()._build_chart(subsection, 'build_odds_chart', data, param)
 
             chart_title, bullets = super()._parse_response(text)
         
-            subschema = self.consolidate_to_subschema(subsection, chart_filepath, chart_title, bullets)
+            subschema = self.consolidate_to_subschema(subsection, chart_filepath, chart_title, bullets, chart_data)
             return subschema
         
         else:
             raise ValueError('invalid subsection')
         
-    def consolidate_to_subschema(self, subsection, chart_filepath, chart_title, bullets):
+    def consolidate_to_subschema(self, subsection, chart_filepath, chart_title, bullets, chart_data=None):
         title_dict = {
             'tendency_bias_rating': "Analyzing Publisher's Tendency to Commit Bias",
             'tendency_bias_category': "Analyzing Publisher's Tendency to Commit Certain Biases (by Category)"
@@ -412,6 +643,7 @@ class PubisherComparisonComponent(Component):
                 'title': title_dict[subsection],
                 'chart_title': chart_title[0],
                 'chart_filepath': chart_filepath,
+                'chart_data': chart_data,
                 'bullets': bullets[0]
             }
         }
@@ -431,9 +663,74 @@ class CaseStudyComponent(Component):
         
         self.schema = dict()
 
+        # Selected articles with their summaries, by subsection
+        self.cases = dict()
+
+    def __attach_analysis_text(self, df, column):
+        """Fetch the analysis text for the selected rows if the dataset was loaded without it"""
+        if column in df.columns or len(df) == 0:
+            return df
+
+        analysis = fetch_analysis_text(df['analysis_rowid'].dropna(), [column])
+        analysis['analysis_rowid'] = analysis['analysis_rowid'].astype(df['analysis_rowid'].dtype)
+        df = df.merge(analysis, on='analysis_rowid', how='left')
+        return df
+
+    def __attach_case_study_summaries(self, df, case_type):
+        """Attach the case study summary of each article as the case_study_summary column
+
+        Summaries are looked up from the precomputed table (see utils/case_studies.py), the
+        ones missing there are extracted from the analysis text instead.
+        """
+        df = df.assign(case_study_summary=None)
+        if len(df) == 0:
+            return df
+
+        if 'analysis_rowid' in df.columns:
+            summaries = fetch_case_study_summaries(df['analysis_rowid'].dropna(), case_type)
+            if summaries is not None:
+                # A summary stored for another article under the same rowid is not used
+                lookup = dict(zip(zip(summaries['analysis_rowid'], summaries['article_id']), summaries['case_study_summary']))
+                df['case_study_summary'] = [lookup.get(key) for key in zip(df['analysis_rowid'], df['article_id'])]
+
+        if df['case_study_summary'].isna().any():
+            column = f'{CASE_TYPE_COLUMNS[case_type]}_analysis'
+            df = self.__attach_analysis_text(df, column)
+            missing = df['case_study_summary'].isna()
+            df.loc[missing, 'case_study_summary'] = [restructure_analysis(a, case_type) for a in df.loc[missing, column]]
+
+        return df
+
+    def inputs(self):
+        # The summaries of the selected articles, which change when the summaries are refreshed
+        cases = [self._select_cases(subsection)[['headline', 'case_study_summary']].astype(str).values.tolist()
+                 for subsection in self.valid_subsections]
+        return dict(super().inputs(), cases=hashlib.sha256(json.dumps(cases).encode('utf-8')).hexdigest())
+
+    def _select_cases(self, subsection):
+        """Articles shown as case studies of the subsection, the prompts are built from their summaries"""
+        if subsection not in self.cases:
+            cases = self.gen.select_case_studies(subsection)
+            self.cases[subsection] = self.__attach_case_study_summaries(cases, subsection)
+        return self.cases[subsection]
+
+    def llm_requests(self, earlier_requests):
+        # Fixed responses are built from the analyses directly
+        if not isinstance(self.gen, Generator):
+            return []
+
+        requests = []
+        for subsection in self.valid_subsections:
+            try:
+                requests += self.gen.case_study_requests(subsection, self._select_cases(subsection))
+            except PromptError:
+                # No case studies of this type, nothing to send
+                continue
+        return requests
+
     def create_subsection(self, subsection):
         if subsection in self.valid_subsections:
-            response_list = self.gen.generate_case_study(case_type=subsection)
+            response_list = self.gen.generate_case_study(case_type=subsection, cases=self._select_cases(subsection))
 
             # If no case studies of the type is found, return an empty list, else return the subschema
             if len(response_list) == 0 or response_list == None:
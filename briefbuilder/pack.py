@@ -0,0 +1,61 @@
+import json
+
+from prs_generator.generator import Prs
+from utils.artifacts import report_files as default_report_files
+from utils.report_store import report_store as default_report_store
+
+TEMPLATE_PATH = 'template.pptx'
+
+def assemble_pack(results, start_date, end_date, output, template_path=TEMPLATE_PATH, artifact_store=None):
+    """Lay out the briefing pack slides from ReportComponentFactory results
+
+    output is a file path or a writable binary file object. Charts are read from the
+    artifact store the results were built with.
+    """
+    factory_json = json.dumps(results)
+    prs = Prs(template_path, factory_json, artifact_store=artifact_store)
+    prs.add_Title_section('Briefing Pack', [start_date, end_date])
+    prs.add_Introduction_section('Introduction', 'Placeholder text')
+    prs.add_Methodology_section(use_json=True)
+    prs.add_KeyFindings_section(use_json=True)
+    prs.add_PublisherPerformance_section(use_json=True)
+    prs.add_PublisherComparison_section(use_json=True)
+    prs.add_UseCases_section(use_json=True)
+    prs.add_Conclusion_section(use_json=True)
+    prs.add_Recommendations_section('Recommendations', 'Placeholder text')
+    prs.save(output)
+    return prs
+
+
+def write_pack(results, start_date, end_date, report_files=None, template_path=TEMPLATE_PATH, artifact_store=None):
+    """Assemble the pack straight into a new file of the report file store, returns its reference"""
+    if report_files is None:
+        report_files = default_report_files
+
+    ref = report_files.new_ref('.pptx')
+    with report_files.writer(ref) as f:
+        assemble_pack(results, start_date, end_date, f, template_path, artifact_store)
+    return ref
+
+
+def open_stored_pack(report_id, report_store=None, report_files=None, template_path=TEMPLATE_PATH):
+    """Binary file of a pack of the report store
+
+    A pack whose PPTX file is gone is laid out again from its stored results and chart
+    artifacts, without running any query, statistics or LLM work.
+    """
+    if report_store is None:
+        report_store = default_report_store
+    if report_files is None:
+        report_files = default_report_files
+
+    report = report_store.get(report_id)
+    if report['pptx_ref'] not in report_files:
+        artifact_store = report_store.artifact_store(report_id)
+        pptx_ref = write_pack(report['results'], report['start_date'], report['end_date'],
+                              report_files, template_path, artifact_store)
+        artifact_store.close()
+        report_store.set_pptx_ref(report_id, pptx_ref)
+        report['pptx_ref'] = pptx_ref
+
+    return report_files.open(report['pptx_ref'])
@@ -0,0 +1,58 @@
+"""Rebuild a stored pack, changing only what needs to change
+
+    python -m briefbuilder.rebuild REPORT_ID [--rebuild "Case Studies" ...]
+
+The report dataset is loaded again and every component whose inputs (query params,
+dataset, chart and LLM settings) have the same fingerprint as in the stored pack keeps
+its schema and charts. Only the other components, and those named with --rebuild, are
+built again before the slides are laid out. The result is saved as a new draft.
+"""
+import argparse
+
+from utils.query import build_query, execute_query_to_dataframe, load_topic_bridge, STAGE_COLUMNS
+from utils.artifacts import report_files as default_report_files
+from utils.report_store import report_store as default_report_store
+from briefbuilder.components import ReportComponentFactory
+from briefbuilder.pack import write_pack, TEMPLATE_PATH
+
+
+def rebuild_report(report_id, rebuild=(), report_store=None, report_files=None, template_path=TEMPLATE_PATH):
+    """Save a new draft of a stored pack, returns its report_id and the names of the components built again"""
+    if report_store is None:
+        report_store = default_report_store
+    if report_files is None:
+        report_files = default_report_files
+
+    report = report_store.get(report_id)
+    params = report['params']
+    sql = build_query(params['selected_publisher'],
+                      params['start_date'], params['end_date'],
+                      params['compared_publishers'],
+                      params['bias_category'],
+                      params['topics'],
+                      columns=STAGE_COLUMNS['report'])
+    query_data = execute_query_to_dataframe(sql)
+
+    previous_artifacts = report_store.artifact_store(report_id)
+    rcf = ReportComponentFactory(params, query_data, load_topic_bridge(sql))
+    rcf.run(report['components'], previous_artifacts, rebuild)
+    previous_artifacts.close()
+
+    pptx_ref = write_pack(rcf.results, params['start_date'], params['end_date'],
+                          report_files, template_path, rcf.artifact_store)
+    new_report_id = report_store.save(params, rcf.results, rcf.artifact_store, pptx_ref,
+                                      components=rcf.component_states)
+    rcf.artifact_store.close()
+
+    return new_report_id, rcf.rebuilt
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the changed components of a stored briefing pack')
+    parser.add_argument('report_id', help='Report to rebuild, see the report store')
+    parser.add_argument('--rebuild', nargs='+', default=[], help='Components to build again even if unchanged')
+    parser.add_argument('--template', default=TEMPLATE_PATH, help='PPTX template')
+    args = parser.parse_args()
+
+    new_report_id, rebuilt = rebuild_report(args.report_id, args.rebuild, template_path=args.template)
+    print(f'Rebuilt {", ".join(rebuilt) or "nothing"}, saved as draft {new_report_id}')
@@ -0,0 +1,117 @@
+"""On-disk cache of rendered charts
+
+Charts are stored as PNG files named by a hash of everything that goes into the render:
+the ChartBuilder method, its arguments (DataFrames hashed by content), the theme (which
+includes the figure size) and the ChartBuilder source. The same chart asked for again,
+e.g. the same publisher and date range in another report, is then read from disk
+without running plotnine at all.
+
+    CHART_CACHE_DIR     directory of the cached charts (default .chart_cache)
+    CHART_CACHE_MAX_MB  disk budget, least recently used charts are evicted beyond it (default 200)
+    CHART_CACHE_BYPASS  1 renders every chart and leaves the cache alone
+"""
+import os
+import inspect
+import hashlib
+import tempfile
+import threading
+import pandas as pd
+
+from .charts import ChartBuilder
+
+CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR', '.chart_cache')
+CHART_CACHE_MAX_MB = float(os.getenv('CHART_CACHE_MAX_MB', 200))
+CHART_CACHE_BYPASS = os.getenv('CHART_CACHE_BYPASS', '0') == '1'
+
+# Changes to the chart code invalidate the charts rendered by the old code
+CHART_CODE_VERSION = hashlib.sha256(inspect.getsource(ChartBuilder).encode('utf-8')).hexdigest()
+
+
+def _update_hash(h, value):
+    if isinstance(value, pd.DataFrame):
+        h.update(b'DataFrame')
+        h.update(repr((list(value.columns), value.dtypes.astype(str).tolist(), value.index.names)).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        h.update(b'Series')
+        h.update(repr((value.name, str(value.dtype), value.index.names)).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    else:
+        h.update(repr(value).encode('utf-8'))
+
+
+def theme_fingerprint(theme):
+    """Properties of every themeable of a plotnine theme, figure size included"""
+    return sorted((name, sorted(t.properties.items(), key=lambda i: i[0]))
+                  for name, t in theme.themeables.items())
+
+
+def chart_key(method, args, theme):
+    """Cache key of the chart rendered by ChartBuilder.<method>(*args) with the theme"""
+    h = hashlib.sha256()
+    h.update(CHART_CODE_VERSION.encode('utf-8'))
+    h.update(method.encode('utf-8'))
+    for arg in args:
+        _update_hash(h, arg)
+    h.update(repr(theme_fingerprint(theme)).encode('utf-8'))
+    return h.hexdigest()
+
+
+class ChartCache:
+    """PNG files by key in a directory, evicting the least recently used beyond max_bytes
+
+    Safe to share between processes: files are written under a temporary name and
+    renamed into place, and reads refresh the modification time used for eviction.
+    """
+
+    def __init__(self, root=CHART_CACHE_DIR, max_bytes=CHART_CACHE_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def __path(self, key):
+        return os.path.join(self.root, f'{key}.png')
+
+    def get(self, key):
+        path = self.__path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key, data):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.__path(key))
+
+        with self._lock:
+            self.__evict()
+
+    def __evict(self):
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.png'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Evicted by another process in the meantime
+                pass
+            total -= size
+
+
+chart_cache = None if CHART_CACHE_BYPASS else ChartCache()
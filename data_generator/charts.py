@@ -1,3 +1,4 @@
+import math
 import pandas as pd
 import numpy as np
 from plotnine import *
@@ -41,7 +42,7 @@ class ChartBuilder:
         )
 
         
-    def build_bar_chart(self, data, c1):
+    def __bar_chart_frame(self, data, c1):
         res = data.set_index(c1)
         
         if ('bias' in res.index.name) and ('rating' in res.index.name):
@@ -128,6 +129,11 @@ class ChartBuilder:
         res['label'] = res['pct'].round(0).astype(int).astype(str) + '%'
         res['label'] = res['count'].astype(str) + ' (' + res['label'] + ')'
 
+        return res
+
+    def build_bar_chart(self, data, c1):
+        res = self.__bar_chart_frame(data, c1)
+
         p = (ggplot(res)
         + geom_bar(aes(x='name', y='count', fill='name'), stat='identity', width=0.60, show_legend=False)
         + geom_label(aes(x='name', y='count', label='label'), color="#474948", ha='center', size=8, show_legend=False)
@@ -142,7 +148,7 @@ class ChartBuilder:
         return p
     
     
-    def build_stacked_bar_chart(self, data, c1):
+    def __stacked_bar_chart_frame(self, data, c1):
         res = data.set_index(c1)
 
         if ('bias' in res.index.name) and ('rating' in res.index.name):
@@ -192,6 +198,11 @@ class ChartBuilder:
         res['label'] = res['label'] + ' (' + res['count'].astype(str) + ')'
         res = res.sort_values('publisher', ascending=False)
 
+        return res
+
+    def build_stacked_bar_chart(self, data, c1):
+        res = self.__stacked_bar_chart_frame(data, c1)
+
         p = (ggplot(res)
         + geom_bar(aes(x='name', y='pct', fill='publisher'), stat='identity', position='dodge', width=0.60)
         + geom_label(aes(x='name', y='pct', label='label', color='publisher'), position=position_dodge(width=0.50), ha='center', size=8, show_legend=False)
@@ -207,11 +218,11 @@ class ChartBuilder:
         return p
 
 
-    def build_heatmap_chart(self, data, c1, c2='bias_rating'):
+    def __heatmap_chart_frame(self, data, c1, c2='bias_rating'):
         if 'bias' not in c2:
             raise ValueError('c2 only accepts bias_rating or bias_category. Please switch columns as needed.')
             
-        res = data
+        res = data.copy()
         if ('bias' in res.index.name) and ('rating' in res.index.name):
             c1_name_map = {
                 '-1': 'Inconclusive',
@@ -342,6 +353,11 @@ class ChartBuilder:
         res_f[c1] = pd.Categorical(res_f[c1], categories=[c for c in res_f[c1].drop_duplicates() if 'Others' in c] + [c for c in res_f[c1].drop_duplicates() if 'Others' not in c], ordered=True)
         res_f[c2] = pd.Categorical(res_f[c2], categories=[c for c in res_f[c2].drop_duplicates() if 'Others' in c] + [c for c in res_f[c2].drop_duplicates() if'Others' not in c], ordered=True)
 
+        return res_f
+
+    def build_heatmap_chart(self, data, c1, c2='bias_rating'):
+        res_f = self.__heatmap_chart_frame(data, c1, c2)
+
         p =(ggplot(res_f)
         + geom_tile(aes(x=c2, y=c1, fill='pct'), color='white', size=1, show_legend=False)
         + geom_label(aes(x=c2, y=c1, label='label'), color="#474948", ha='center', size=8, show_legend=False)
@@ -357,7 +373,7 @@ class ChartBuilder:
         return p
     
 
-    def build_odds_chart(self, data, c2):
+    def __odds_chart_frame(self, data, c2):
         res = data.set_index(c2)
 
         if ('bias' in res.index.name) and ('rating' in res.index.name):
@@ -403,6 +419,11 @@ class ChartBuilder:
         res['name_label'] = pd.Categorical(values=res['name_label'], categories=res['name_label'].drop_duplicates(), ordered=True)
         res['label'] = res['OR'].round(2)
 
+        return res
+
+    def build_odds_chart(self, data, c2):
+        res = self.__odds_chart_frame(data, c2)
+
         p = (ggplot(res)
         + geom_hline(yintercept=1, color='#e8e8e8', size=2)
         + geom_hline(yintercept=2, color='#e8e8e8', size=2)
@@ -420,3 +441,109 @@ class ChartBuilder:
         )
 
         return p
+
+
+    # Chart data for native PowerPoint charts, built from the same frames as the plots above.
+    # Everything is plain lists and strings, so it can go into the report schema as JSON.
+
+    def __gradient_color(self, pct, low, high, colors=('#EB8483', '#C22625')):
+        if pct is None or pd.isna(pct):
+            return '#e8e8e8'
+        share = 0 if high == low else (pct - low) / (high - low)
+        start, end = [tuple(int(c[i:i + 2], 16) for i in (1, 3, 5)) for c in colors]
+        return '#' + ''.join(f'{round(a + (b - a) * share):02X}' for a, b in zip(start, end))
+
+    def build_bar_chart_data(self, data, c1):
+        res = self.__bar_chart_frame(data, c1).sort_values('name')
+
+        return {
+            'type': 'bar',
+            'categories': res['name'].astype(str).tolist(),
+            'series': [{'name': 'Number of Articles', 'values': res['count'].astype(float).tolist(),
+                        'labels': res['label'].tolist(), 'colors': res['color'].tolist()}],
+            'value_axis_title': 'Number of Articles',
+            'category_axis_title': c1.replace('_', ' ').title(),
+            'number_format': '0'
+        }
+
+    def build_stacked_bar_chart_data(self, data, c1):
+        res = self.__stacked_bar_chart_frame(data, c1)
+        categories = [str(c) for c in res['name'].cat.remove_unused_categories().cat.categories]
+        colors = ['#222222', '#949494']
+
+        series = []
+        for n, (publisher, group) in enumerate(res.groupby('publisher', sort=True)):
+            # Several values can map to the same name, e.g. 'Others', which is one bar
+            group = group.groupby(group['name'].astype(str))[['count', 'pct']].sum()
+            labels = group['pct'].round(0).astype(int).astype(str) + '% (' + group['count'].astype(str) + ')'
+            series.append({
+                'name': str(publisher),
+                'values': [float(group['pct'].get(c, 0)) for c in categories],
+                'labels': [str(labels.get(c, '')) for c in categories],
+                'color': colors[n % len(colors)]
+            })
+
+        return {
+            'type': 'clustered_bar',
+            'categories': categories,
+            'series': series,
+            'value_axis_title': '% of Articles',
+            'category_axis_title': c1.replace('_', ' ').title(),
+            'number_format': '0"%"'
+        }
+
+    def build_heatmap_chart_data(self, data, c1, c2='bias_rating'):
+        res_f = self.__heatmap_chart_frame(data, c1, c2)
+        rows = [str(r) for r in res_f[c1].cat.categories]
+        columns = [str(c) for c in res_f[c2].cat.categories]
+        low, high = res_f['pct'].min(), res_f['pct'].max()
+
+        cells = {(str(r[c1]), str(r[c2])): r for _, r in res_f.iterrows()}
+        table_rows = []
+        for row in rows:
+            labels, colors = [], []
+            for column in columns:
+                cell = cells.get((row, column))
+                pct = None if cell is None else cell['pct']
+                labels.append('' if cell is None else str(cell['label']).replace('\n', ' '))
+                colors.append(self.__gradient_color(pct, low, high))
+            table_rows.append({'name': row, 'labels': labels, 'colors': colors})
+
+        return {
+            'type': 'table',
+            'row_title': c1.replace('_', ' ').title(),
+            'columns': columns,
+            'rows': table_rows
+        }
+
+    def __finite_odds(self, odds, labels):
+        """Odds ratios a chart and JSON can hold: infinite ones are drawn past the largest finite one, undefined ones as 0"""
+        finite = [x for x in odds if math.isfinite(x)]
+        cap = max(finite) * 1.1 if len(finite) > 0 and max(finite) > 0 else 1.0
+
+        values, value_labels = [], []
+        for x, label in zip(odds, labels):
+            if math.isfinite(x):
+                values.append(x)
+                value_labels.append(label)
+            elif x > 0:
+                values.append(cap)
+                value_labels.append('∞')
+            else:
+                values.append(0.0)
+                value_labels.append('n/a')
+        return values, value_labels
+
+    def build_odds_chart_data(self, data, c2):
+        res = self.__odds_chart_frame(data, c2)
+        values, labels = self.__finite_odds(res['OR'].astype(float).tolist(), res['label'].astype(str).tolist())
+
+        return {
+            'type': 'bar',
+            'categories': res['name_label'].astype(str).tolist(),
+            'series': [{'name': 'Odds Ratio', 'values': values,
+                        'labels': labels, 'colors': res['color'].tolist()}],
+            'value_axis_title': 'Odds Ratio',
+            'category_axis_title': c2.replace('_', ' ').title(),
+            'number_format': '0.0'
+        }
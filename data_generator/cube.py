@@ -0,0 +1,51 @@
+import pandas as pd
+
+# Bias category flags of the report dataset
+BIAS_CATEGORIES = {
+    'generalisation',
+    'omit_due_prominence',
+    'negative_aspects',
+    'misrepresentation',
+    'headline_bias'
+}
+
+class StatsCube:
+    """Counts of the report dataset over publisher x bias rating x location (x topic)
+
+    Built in one pass over the rows. Each cell holds the number of rows `n`, the sum of
+    every bias category flag and the number of rows where the flag is set (`<flag>_rows`).
+    The topic cube repeats every row once per topic of its article, like exploding the
+    topic column does.
+
+    The statistics are aggregations over the cells instead of the rows, so their cost
+    does not grow with the number of publishers compared or articles retrieved. Cells
+    keep the order in which their first row appears in the dataset.
+    """
+
+    DIMENSIONS = ['publisher', 'bias_rating', 'location']
+
+    def __init__(self, query_data, topic_bridge):
+        self.categories = [c for c in query_data.columns if c in BIAS_CATEGORIES]
+
+        rows = query_data[self.DIMENSIONS + ['article_id'] + self.categories]
+        self.row_cells = self.__aggregate(rows, self.DIMENSIONS)
+
+        pairs = rows.merge(topic_bridge.pairs(), on='article_id', how='left')
+        self.topic_cells = self.__aggregate(pairs, self.DIMENSIONS + ['topic'])
+
+    def __aggregate(self, df, dimensions):
+        # Null dimensions are kept as cells of their own, the statistics drop them when grouping
+        grouped = df.groupby(dimensions, dropna=False, sort=False)
+        cells = grouped.size().rename('n').to_frame()
+        if len(self.categories) > 0:
+            cells = cells.join(grouped[self.categories].sum())
+            cells = cells.join(grouped[self.categories].count().add_suffix('_rows'))
+        return cells.reset_index()
+
+    def cells(self, publishers, with_topics=False, biased_only=False):
+        """Cells of the given publishers, optionally split by topic and limited to bias rating 1 and 2"""
+        cells = self.topic_cells if with_topics else self.row_cells
+        mask = cells['publisher'].isin(publishers)
+        if biased_only:
+            mask &= cells['bias_rating'] >= 1
+        return cells[mask]
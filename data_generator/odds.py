@@ -0,0 +1,140 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from scipy.special import gammaln, logsumexp
+
+from data_generator.cube import BIAS_CATEGORIES
+
+# Relative tolerance when comparing table probabilities, so that tables which are
+# equally likely in exact arithmetic are not split by rounding in log space
+PMF_RTOL = 1e-7
+
+def _log_choose(n, k):
+    return gammaln(n + 1) - gammaln(k + 1) - gammaln(n - k + 1)
+
+@lru_cache(maxsize=65536)
+def fisher_exact(a, b, c, d):
+    """Odds ratio and two-sided p-value of the 2x2 table [[a, b], [c, d]]
+
+    Same results as scipy.stats.fisher_exact, computed from the hypergeometric log
+    probabilities of every table with the same margins. Memoized on the table, as the
+    same tables come back for every report over the same data.
+    """
+    if a + b == 0 or c + d == 0 or a + c == 0 or b + d == 0:
+        return np.nan, 1.0
+
+    if c > 0 and b > 0:
+        odds_ratio = a * d / (c * b)
+    else:
+        odds_ratio = np.inf
+
+    # Tables with the same margins, indexed by their top left cell
+    n1, n2, n = a + b, c + d, a + c
+    k = np.arange(max(0, n - n2), min(n, n1) + 1)
+    log_pmf = _log_choose(n1, k) + _log_choose(n2, n - k) - _log_choose(n1 + n2, n)
+    log_pexact = log_pmf[a - k[0]]
+
+    # Two-sided: sum the probabilities of all tables at most as likely as the observed one
+    threshold = log_pexact + np.log1p(PMF_RTOL)
+    if log_pmf.max() <= threshold:
+        return odds_ratio, 1.0
+    pvalue = np.exp(logsumexp(log_pmf[log_pmf <= threshold]))
+
+    return odds_ratio, min(float(pvalue), 1.0)
+
+def fisher_exact_tables(tables):
+    """Odds ratios and p-values of an array of 2x2 tables with shape (..., 2, 2)"""
+    tables = np.asarray(tables, dtype=np.int64)
+    flat = tables.reshape(-1, 4)
+
+    odds_ratio = np.empty(len(flat))
+    pvalue = np.empty(len(flat))
+    for i, (a, b, c, d) in enumerate(flat.tolist()):
+        odds_ratio[i], pvalue[i] = fisher_exact(a, b, c, d)
+
+    return odds_ratio.reshape(tables.shape[:-2]), pvalue.reshape(tables.shape[:-2])
+
+def value_counts(df_cells, c2):
+    """Rows with and without every value of c2, per cube cell
+
+    Returns the cells used, the values and two frames (cells x values) counting the rows
+    that have and do not have each value.
+
+    Accepted values for c2:
+    'bias_rating', 'bias_category'
+    """
+    if c2 == 'bias_rating':
+        # Filter out negative bias rating
+        df_cells = df_cells[df_cells['bias_rating'] != -1]
+        value_list = df_cells['bias_rating'].dropna().unique().tolist()
+
+        n_true = pd.DataFrame({
+            value: df_cells['n'].where(df_cells['bias_rating'] == value, 0) for value in value_list
+        }, index=df_cells.index, columns=value_list)
+        n_true['1+2'] = df_cells['n'].where(df_cells['bias_rating'].isin([1, 2]), 0)
+        value_list.append('1+2')
+        n_false = n_true.rsub(df_cells['n'], axis=0)
+
+    elif c2 == 'bias_category':
+        # Find bias categories that are present in dataframe
+        value_list = list(set(df_cells.columns).intersection(BIAS_CATEGORIES))
+        n_true = df_cells[value_list]
+        n_false = df_cells[[f'{value}_rows' for value in value_list]].set_axis(value_list, axis=1) - n_true
+
+    else:
+        raise ValueError(f"Unknown category: {c2}")
+
+    return df_cells, value_list, n_true, n_false
+
+def odds_table(df_cells, is_target, c2):
+    """Odds of the target cells having each value of c2, against all other cells
+
+    Every contingency table comes from one group-by of the cells on is_target.
+    """
+    df_cells, value_list, n_true, n_false = value_counts(df_cells, c2)
+    is_target = is_target.reindex(df_cells.index)
+
+    true = n_true.groupby(is_target).sum().reindex([False, True], fill_value=0)
+    false = n_false.groupby(is_target).sum().reindex([False, True], fill_value=0)
+
+    # One table per value: [[others without, others with], [target without, target with]]
+    tables = np.stack([false.to_numpy(), true.to_numpy()], axis=-1).transpose(1, 0, 2)
+    odds_ratio, pvalue = fisher_exact_tables(tables)
+
+    dict_odds = {}
+    for i, value in enumerate(value_list):
+        dict_odds[value] = {
+            'OR': odds_ratio[i],
+            'pvalue': pvalue[i],
+            'count': float(tables[i, 1, 1])
+        }
+    return pd.DataFrame(dict_odds).T.reset_index(names=c2)
+
+def odds_league_table(df_cells, c2, publishers=None):
+    """Odds of every publisher against all other publishers of the cells, for each value of c2
+
+    A single group-by of the cells by publisher gives every publisher's counts, the
+    rest of the corpus is the total minus the publisher.
+    """
+    df_cells, value_list, n_true, n_false = value_counts(df_cells, c2)
+
+    true = n_true.groupby(df_cells['publisher']).sum()
+    false = n_false.groupby(df_cells['publisher']).sum()
+    if publishers is not None:
+        true = true.reindex(publishers, fill_value=0)
+        false = false.reindex(publishers, fill_value=0)
+
+    own = np.stack([false.to_numpy(), true.to_numpy()], axis=-1)
+    rest = np.stack([n_false.sum().to_numpy(), n_true.sum().to_numpy()], axis=-1) - own
+    tables = np.stack([rest, own], axis=-2)
+    odds_ratio, pvalue = fisher_exact_tables(tables)
+
+    df_league = pd.DataFrame({
+        'publisher': np.repeat(true.index.to_numpy(), len(value_list)),
+        c2: value_list * len(true.index),
+        'OR': odds_ratio.ravel(),
+        'pvalue': pvalue.ravel(),
+        'count': tables[..., 1, 1].ravel().astype(float)
+    })
+    return df_league
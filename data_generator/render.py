@@ -0,0 +1,174 @@
+"""Chart rendering in worker processes
+
+A plotnine render takes about a second of CPU time, so the charts of a report are
+rendered in a pool of worker processes while the report is being built. Jobs name the
+ChartBuilder method and its arguments (plotnine plots cannot be pickled), and results
+are PNG bytes rather than files.
+
+CHART_RENDER_WORKERS sets the pool size (default one worker per CPU, up to 6), 0 renders
+in the calling thread instead, which is also the default on a single CPU. Charts found in
+the chart cache (see chart_cache.py) are not rendered again.
+"""
+import os
+import io
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .charts import ChartBuilder
+from .chart_cache import chart_cache as default_chart_cache, chart_key
+
+# A report has six charts, a pool on a single CPU would only add overhead
+_cpus = min(os.cpu_count() or 1, 6)
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', _cpus if _cpus > 1 else 0))
+
+# Chart builder of a worker process, set once by _init_worker
+_worker = dict()
+
+
+def render_png(plot):
+    """PNG bytes of a plotnine plot"""
+    buffer = io.BytesIO()
+    plot.save(buffer, format='png', verbose=False)
+    return buffer.getvalue()
+
+
+def _init_worker():
+    _worker['chart_builder'] = ChartBuilder()
+
+
+def _warm_up():
+    return None
+
+
+def _render(method, args):
+    return render_png(getattr(_worker['chart_builder'], method)(*args))
+
+
+def _copy_outcome(source, target):
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class ChartRenderService:
+    """Renders ChartBuilder charts to PNG bytes, returning a Future per chart
+
+    The worker pool is started on the first job and shared by every report of the process.
+    """
+
+    def __init__(self, chart_builder=None, workers=CHART_RENDER_WORKERS, chart_cache=default_chart_cache):
+        self.chart_builder = chart_builder
+        self.workers = workers
+        self.chart_cache = chart_cache
+        self._executor = None
+        self._lock = threading.Lock()
+
+        # Theme of the charts, workers use the default one of ChartBuilder
+        self.theme = (chart_builder or ChartBuilder()).theme
+
+    def __executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the database connections of the parent
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=_init_worker)
+            return self._executor
+
+    def __drop_executor(self, executor):
+        """Forget a pool broken by a dead worker (e.g. out of memory), the next job starts a fresh one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def start(self):
+        """Start the workers ahead of the first report, so importing plotnine is out of the way"""
+        if self.workers > 0 and self._executor is None:
+            executor = self.__executor()
+            for _ in range(self.workers):
+                executor.submit(_warm_up)
+
+    def __cache_key(self, method, args):
+        if self.chart_cache is None:
+            return None
+        try:
+            return chart_key(method, args, self.theme)
+        except TypeError:
+            # Arguments that cannot be hashed by content are rendered every time
+            return None
+
+    def __store(self, key, future):
+        if not future.cancelled() and future.exception() is None:
+            self.chart_cache.put(key, future.result())
+
+    def submit(self, method, *args):
+        """Render chart_builder.<method>(*args) to PNG, or read it from the chart cache"""
+        key = self.__cache_key(method, args)
+        if key is not None:
+            png = self.chart_cache.get(key)
+            if png is not None:
+                future = Future()
+                future.set_result(png)
+                return future
+
+        future = self.__render(method, args)
+        if key is not None:
+            future.add_done_callback(lambda f: self.__store(key, f))
+        return future
+
+    def __render_in_pool(self, method, args, retries=1):
+        """Render in the worker pool, once more on a fresh pool if a worker died"""
+        executor = self.__executor()
+        try:
+            job = executor.submit(_render, method, args)
+        except BrokenProcessPool:
+            self.__drop_executor(executor)
+            if retries == 0:
+                raise
+            return self.__render_in_pool(method, args, retries - 1)
+
+        future = Future()
+
+        def done(job):
+            if retries > 0 and not job.cancelled() and isinstance(job.exception(), BrokenProcessPool):
+                # A worker died while this chart was queued or rendering
+                self.__drop_executor(executor)
+                try:
+                    retry = self.__render_in_pool(method, args, retries - 1)
+                except BrokenProcessPool as e:
+                    future.set_exception(e)
+                    return
+                retry.add_done_callback(lambda retry: _copy_outcome(retry, future))
+            else:
+                _copy_outcome(job, future)
+
+        job.add_done_callback(done)
+        return future
+
+    def __render(self, method, args):
+        if self.workers > 0:
+            return self.__render_in_pool(method, args)
+
+        future = Future()
+        try:
+            if self.chart_builder is None:
+                self.chart_builder = ChartBuilder()
+            future.set_result(render_png(getattr(self.chart_builder, method)(*args)))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+render_service = ChartRenderService()
@@ -0,0 +1,20 @@
+import os
+from dotenv import load_dotenv
+
+from .handler import OpenAITextGenerator
+from .fake import FakeTextGenerator
+
+# Text generator backends by TEXT_GENERATOR value
+BACKENDS = {
+    'openai': OpenAITextGenerator,
+    'fake': FakeTextGenerator,
+}
+
+
+def create_text_generator():
+    """Text generator backend chosen by TEXT_GENERATOR ('openai' by default, 'fake' runs offline)"""
+    load_dotenv()
+    backend = os.getenv('TEXT_GENERATOR', 'openai')
+    if backend not in BACKENDS:
+        raise ValueError(f'TEXT_GENERATOR must be one of {sorted(BACKENDS)}, got {backend!r}')
+    return BACKENDS[backend]()
@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+def fingerprint(model, messages):
+    """Cache key of a chat request: the model and every message sent, system prompt included"""
+    payload = json.dumps({'model': model, 'messages': messages}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """On-disk cache of LLM responses in a SQLite file, shared by processes
+
+    Responses expire ttl_seconds after they were stored. When the stored responses grow
+    past max_bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path, ttl_seconds, max_bytes):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def __connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory != '':
+                os.makedirs(directory, exist_ok=True)
+
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            with self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_responses (
+                        key TEXT PRIMARY KEY,
+                        model TEXT,
+                        response TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_used_at REAL NOT NULL
+                    )""")
+                self._conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used_at ON llm_responses (last_used_at)')
+        return self._conn
+
+    def get(self, key):
+        """Cached response of the key, or None if missing or expired"""
+        with self._lock:
+            conn = self.__connect()
+            row = conn.execute('SELECT response, created_at FROM llm_responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+
+            response, created_at = row
+            now = time.time()
+            with conn:
+                if now - created_at > self.ttl_seconds:
+                    conn.execute('DELETE FROM llm_responses WHERE key = ?', (key,))
+                    return None
+                conn.execute('UPDATE llm_responses SET last_used_at = ? WHERE key = ?', (now, key))
+            return response
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self._lock:
+            conn = self.__connect()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO llm_responses (key, model, response, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, model, response, len(response.encode('utf-8')), now, now)
+                )
+                self.__evict(conn, now)
+
+    def __evict(self, conn, now):
+        conn.execute('DELETE FROM llm_responses WHERE created_at < ?', (now - self.ttl_seconds,))
+
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM llm_responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Least recently used first, until the rest fits
+        evicted = []
+        for key, size in conn.execute('SELECT key, size FROM llm_responses ORDER BY last_used_at'):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        conn.executemany('DELETE FROM llm_responses WHERE key = ?', evicted)
+
+    def clear(self):
+        with self._lock:
+            conn = self.__connect()
+            with conn:
+                conn.execute('DELETE FROM llm_responses')
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,56 @@
+import tiktoken
+
+# Framing tokens the chat format adds per message, and the tokens priming the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Encodings by model, None where tiktoken could not load one
+_encodings = dict()
+
+
+def get_encoding(model):
+    """tiktoken encoding of the model, or None if it is not available (e.g. offline)"""
+    if model not in _encodings:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except (KeyError, AttributeError):
+                # Model unknown to tiktoken (or not set), use the encoding of current models
+                encoding = tiktoken.get_encoding('o200k_base')
+        except Exception:
+            # The encoding files could not be downloaded, counts fall back to an estimate
+            encoding = None
+        _encodings[model] = encoding
+    return _encodings[model]
+
+
+def count_tokens(text, encoding):
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, encoding):
+    """Prompt tokens of a chat request"""
+    return sum(TOKENS_PER_MESSAGE + count_tokens(m['content'], encoding) for m in messages) + TOKENS_PER_REPLY
+
+
+def fit_to_budget(messages, max_tokens, encoding):
+    """Drop the oldest turns of a conversation until it fits in max_tokens
+
+    messages is the system prompt, earlier (user, assistant) turns and the new prompt.
+    The system prompt and the new prompt are always kept. Returns the messages to send
+    and the number of turns dropped.
+    """
+    system, turns, prompt = messages[:1], messages[1:-1], messages[-1:]
+    sizes = [TOKENS_PER_MESSAGE + count_tokens(m['content'], encoding) for m in turns]
+    total = count_message_tokens(system + prompt, encoding) + sum(sizes)
+
+    dropped = 0
+    while total > max_tokens and len(turns) > 0:
+        # A turn is the user message and the assistant reply to it
+        total -= sum(sizes[:2])
+        turns, sizes = turns[2:], sizes[2:]
+        dropped += 1
+
+    return system + turns + prompt, dropped
@@ -0,0 +1,68 @@
+import os
+import time
+import random
+import hashlib
+
+from .handler import OpenAITextGenerator
+
+WORDS = ['coverage', 'articles', 'publisher', 'bias', 'Muslims', 'reporting', 'generalisation', 'prominence',
+         'headlines', 'topics', 'politics', 'religion', 'share', 'period', 'compared', 'higher', 'lower',
+         'consistent', 'pattern', 'stories', 'framing', 'voices', 'analysis', 'trend']
+
+
+class FakeTextGenerator(OpenAITextGenerator):
+    """Offline stand-in for the OpenAI backend, for performance tests without network or API costs
+
+    Replies are [TITLE] followed by bullet points, like the model is asked to answer, with
+    latency and length drawn from normal distributions:
+
+        FAKE_LLM_LATENCY_MS, FAKE_LLM_LATENCY_SD_MS  milliseconds slept per request (default 800, 200)
+        FAKE_LLM_TOKENS, FAKE_LLM_TOKENS_SD          words per reply (default 120, 40)
+        FAKE_LLM_SEED                                 seed of the draws (default 0)
+
+    The same messages always get the same reply and latency. Replies are not cached on disk.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.model = 'fake'
+        self.response_cache = None
+
+        self.latency_ms = float(os.getenv('FAKE_LLM_LATENCY_MS', 800))
+        self.latency_sd_ms = float(os.getenv('FAKE_LLM_LATENCY_SD_MS', 200))
+        self.tokens = float(os.getenv('FAKE_LLM_TOKENS', 120))
+        self.tokens_sd = float(os.getenv('FAKE_LLM_TOKENS_SD', 40))
+        self.seed = os.getenv('FAKE_LLM_SEED', '0')
+
+    def _create_client(self):
+        return None
+
+    def __title(self, prompt):
+        lines = [line.strip() for line in prompt.strip().splitlines()]
+
+        # Case studies are titled with the article headline
+        for line in lines:
+            if line.startswith('HEADLINE:'):
+                return line[len('HEADLINE:'):].strip()
+
+        # Otherwise the section header of the prompt, e.g. [ANALYZE TOPICS]
+        for line in lines:
+            if line.startswith('[') and ']' in line:
+                return line[1:line.index(']')].title()
+        return 'Response'
+
+    def _complete(self, messages):
+        digest = hashlib.sha256((self.seed + ''.join(m['content'] for m in messages)).encode('utf-8')).hexdigest()
+        rng = random.Random(digest)
+
+        time.sleep(max(0, rng.gauss(self.latency_ms, self.latency_sd_ms)) / 1000)
+
+        n_words = max(1, round(rng.gauss(self.tokens, self.tokens_sd)))
+        bullets = []
+        while n_words > 0:
+            length = min(n_words, rng.randint(8, 20))
+            words = [rng.choice(WORDS) for _ in range(length)]
+            bullets.append('- ' + ' '.join(words).capitalize() + '.')
+            n_words -= length
+
+        return f"[{self.__title(messages[-1]['content'])}]\n" + '  \n'.join(bullets)
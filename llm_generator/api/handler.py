@@ -1,9 +1,13 @@
 import os
 import tiktoken
 import json
+import threading
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from .context import get_encoding, count_message_tokens, fit_to_budget
+from .cache import ResponseCache, fingerprint
+
 
 class OpenAITextGenerator:
     def __init__(self):
@@ -12,9 +16,26 @@ class OpenAITextGenerator:
         load_dotenv()
 
         # Get the API key from the .env file
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = self._create_client()
         self.model = os.getenv("MODEL")
 
+        # 'full' resends the whole conversation, 'budget' drops the oldest turns that do
+        # not fit in LLM_CONTEXT_TOKENS
+        self.context_mode = os.getenv("LLM_CONTEXT_MODE", "full")
+        self.context_tokens = int(os.getenv("LLM_CONTEXT_TOKENS", 16000))
+        if self.context_mode not in ['full', 'budget']:
+            raise ValueError(f"LLM_CONTEXT_MODE must be 'full' or 'budget', got {self.context_mode!r}")
+
+        # Responses are cached on disk by model and messages sent, LLM_CACHE_BYPASS=1 always
+        # asks the model and refreshes the cached response
+        self.response_cache = ResponseCache(os.getenv("LLM_CACHE_PATH", "llm_cache.db"),
+                                            float(os.getenv("LLM_CACHE_TTL_HOURS", 24 * 30)) * 3600,
+                                            float(os.getenv("LLM_CACHE_MAX_MB", 256)) * 1024 * 1024)
+        self.cache_bypass = os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+
+        # Prompt tokens sent per request
+        self.token_log = []
+
         system_prompt_v2 = """
         You are an expert journalist from the United Kingdom. We will be writing a report for the Center for Media Monitoring, or CfMM,
         a UK-based organization promoting fair and responsible reporting Of Muslims And Islam. CfMM engages constructively with the media, 
@@ -125,20 +146,79 @@ class OpenAITextGenerator:
                 "content": system_prompt_v2
             }
         ]
+
+        # Guards self.messages when prompts are sent from several threads
+        self._lock = threading.Lock()
     
-    def generate_text(self, prompt):
-        
-        # Append the user's message to the conversation
-        self.messages.append({"role": "user", "content": prompt})
-        
+    def _create_client(self):
+        return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    def _complete(self, messages):
         # Get the response from the API
         response = self.client.chat.completions.create(
             model=self.model,
-            messages=self.messages,
+            messages=messages,
         )
+        return response.choices[0].message.content
+
+    def __send(self, messages):
+        encoding = get_encoding(self.model)
+
+        dropped = 0
+        if self.context_mode == 'budget':
+            messages, dropped = fit_to_budget(messages, self.context_tokens, encoding)
+
+        key = fingerprint(self.model, messages)
+        generated_text = None
+        if self.response_cache is not None and not self.cache_bypass:
+            generated_text = self.response_cache.get(key)
+        cached = generated_text is not None
+
+        tokens = count_message_tokens(messages, encoding)
+        with self._lock:
+            self.token_log.append({'tokens': tokens, 'messages': len(messages), 'dropped_turns': dropped, 'cached': cached})
+
+        if not cached:
+            generated_text = self._complete(messages)
+            if self.response_cache is not None:
+                self.response_cache.put(key, self.model, generated_text)
+        return generated_text
+
+    def tokens_sent(self):
+        """Total prompt tokens sent so far, cached responses excluded"""
+        with self._lock:
+            return sum(call['tokens'] for call in self.token_log if not call['cached'])
+
+    def generate_text(self, prompt):
         
-        # Extract and add the assistant's response to the conversation
-        generated_text = response.choices[0].message.content
-        self.messages.append({"role": "assistant", "content": generated_text})
+        # Append the user's message to the conversation
+        with self._lock:
+            self.messages.append({"role": "user", "content": prompt})
+            messages = list(self.messages)
+        
+        generated_text = self.__send(messages)
+
+        # Add the assistant's response to the conversation
+        with self._lock:
+            self.messages.append({"role": "assistant", "content": generated_text})
         
+        return generated_text
+
+    def complete(self, prompt, history=()):
+        """Send a prompt with only the system prompt and the given (prompt, response) turns as context
+
+        Used for prompts sent concurrently, the turn is added to the conversation once answered.
+        """
+        messages = [self.messages[0]]
+        for turn_prompt, turn_response in history:
+            messages.append({"role": "user", "content": turn_prompt})
+            messages.append({"role": "assistant", "content": turn_response})
+        messages.append({"role": "user", "content": prompt})
+
+        generated_text = self.__send(messages)
+
+        with self._lock:
+            self.messages.append({"role": "user", "content": prompt})
+            self.messages.append({"role": "assistant", "content": generated_text})
+
         return generated_text
\ No newline at end of file
@@ -1,8 +1,7 @@
 from .prompt.exceptions import PromptError
 from .prompt.utils import (filter_dataset,
                           sort_and_filter_by_case_type, 
-                          convert_df_to_json_list_v2,
-                          restructure_analysis)
+                          convert_df_to_json_list_v2)
 class FixedResponseGenerator:
 
     def __init__(self, query_params, query_results):
@@ -39,18 +38,18 @@ class FixedResponseGenerator:
         return query_params_modified
 
 
-    def generate_case_study(self, case_type):
-        # Filter out articles that do not fit the specified case type
-        df = sort_and_filter_by_case_type(self.data, case_type)
+    def select_case_studies(self, case_type):
+        """Articles of the selected publisher to present as case studies of the type"""
+        return sort_and_filter_by_case_type(self.data, case_type)
 
-        # Refine n examples and resample the dataframe
-        article_json = convert_df_to_json_list_v2(df, case_type)
+    def generate_case_study(self, case_type, cases):
+        # cases are from select_case_studies(), with their case_study_summary attached
+        article_json = convert_df_to_json_list_v2(cases, case_type)
 
         response_list = []
         for n, article in enumerate(article_json):
             headline = article['headline']
-            analysis = restructure_analysis(article['analysis'], case_type)
-            response = f'[{headline}] {analysis}'
+            response = f"[{headline}] {article['summary']}"
             response_list.append(response)
 
         return response_list
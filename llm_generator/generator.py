@@ -1,32 +1,97 @@
-from .api.handler import OpenAITextGenerator
+from concurrent.futures import ThreadPoolExecutor
+
+from .api.backends import create_text_generator
 from .prompt.prompter import Prompt
 from .prompt.exceptions import PromptError
-from .prompt.utils import sort_and_filter_by_case_type, convert_df_to_json_list_v2
+from .scheduler import PromptScheduler
 
 class Generator:
     def __init__(self, query_params, query_data):
         self.prompt = Prompt(query_params, query_data)
-        self.api_handler = OpenAITextGenerator()
+        self.api_handler = create_text_generator()
+
+        # Responses sent ahead of time by prefetch(), by prompt
+        self.prefetched = dict()
+        self.pending_prefetch = None
+
+    def prefetch(self, requests):
+        """Send (name, prompt, depends_on) requests concurrently ahead of the generate_* calls
+
+        A later generate_* call building the same prompt returns the prefetched response
+        instead of calling the API again.
+        """
+        responses = PromptScheduler(self.api_handler).run(requests)
+        for name, prompt, _ in requests:
+            self.prefetched.setdefault(prompt, []).append(responses[name])
+        return responses
+
+    def prefetch_in_background(self, requests):
+        """Run prefetch() in a thread, the generate_* calls wait for it to finish"""
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_prefetch = executor.submit(self.prefetch, requests)
+        executor.shutdown(wait=False)
+
+    def __wait_for_prefetch(self):
+        if self.pending_prefetch is not None:
+            pending, self.pending_prefetch = self.pending_prefetch, None
+            pending.result()
+
+    def __respond(self, prompt):
+        self.__wait_for_prefetch()
+        if len(self.prefetched.get(prompt, [])) > 0:
+            return self.prefetched[prompt].pop(0)
+        return self.api_handler.generate_text(prompt)
+
+    def select_case_studies(self, case_type):
+        return self.prompt.select_case_studies(case_type)
+
+    def case_study_requests(self, case_type, cases):
+        """Case study prompts as scheduler requests, follow-up articles build on the first one's instructions"""
+        prompt_list = self.prompt.build_case_studies(case_type, cases)
+        requests = []
+        for n, prompt in enumerate(prompt_list):
+            depends_on = [f'case_study:{case_type}:0'] if n > 0 else []
+            requests.append((f'case_study:{case_type}:{n}', prompt, depends_on))
+        return requests
 
+    def analysis_request(self, name, analysis_type, data, depends_on=()):
+        """Analysis prompt as a scheduler request, sent with the turns of depends_on as its conversation"""
+        return (name, self.build_analysis_prompt(analysis_type, data), list(depends_on))
+
+    def methodology_request(self):
+        return ('methodology', self.prompt.build_methodology(), [])
+
+    def conclusions_request(self, depends_on):
+        return ('conclusions', self.prompt.build_conclusions(), depends_on)
+
+    def key_message_request(self, depends_on):
+        return ('key_message', self.prompt.build_key_message(), depends_on)
     
     def generate_methodology(self):
         prompt = self.prompt.build_methodology()
-        response = self.api_handler.generate_text(prompt)
+        response = self.__respond(prompt)
         return response
 
-    def generate_case_study(self, case_type):
+    def generate_case_study(self, case_type, cases):
 
         try:
-            prompt_list = self.prompt.build_case_studies(case_type)
+            requests = self.case_study_requests(case_type, cases)
+            self.__wait_for_prefetch()
+
+            # Articles are summarized concurrently unless they were already prefetched
+            missing = [r for r in requests if len(self.prefetched.get(r[1], [])) == 0]
+            if len(missing) == len(requests):
+                self.prefetch(requests)
+
             response_list = []
-            for prompt in prompt_list:
-                response = self.api_handler.generate_text(prompt)
+            for _, prompt, _ in requests:
+                response = self.__respond(prompt)
                 response_list.append(response)
             return response_list
         except Exception as e:
             raise ValueError(e)
 
-    def generate_analysis(self, analysis_type, data):
+    def build_analysis_prompt(self, analysis_type, data):
         if analysis_type == 'topic':
             prompt = self.prompt.analyze_topics(data)
         elif analysis_type == 'bias_rating':
@@ -37,16 +102,19 @@ class Generator:
             prompt = self.prompt.analyze_bias_tendency(data)
         else:
             raise PromptError('Invalid analysis type. Must be either "topic", "bias_rating", "bias_category" or "tendency"')
+        return prompt
 
-        response = self.api_handler.generate_text(prompt)
+    def generate_analysis(self, analysis_type, data):
+        prompt = self.build_analysis_prompt(analysis_type, data)
+        response = self.__respond(prompt)
         return response
     
     def generate_conclusions(self):
         prompt = self.prompt.build_conclusions()
-        response = self.api_handler.generate_text(prompt)
+        response = self.__respond(prompt)
         return response
     
     def generate_key_message(self):
         prompt = self.prompt.build_key_message()
-        response = self.api_handler.generate_text(prompt)
-        return response
\ No newline at end of file
+        response = self.__respond(prompt)
+        return response
@@ -2,8 +2,7 @@ import json
 import pandas as pd
 from .utils import (filter_dataset,
                     sort_and_filter_by_case_type, 
-                    convert_df_to_json_list_v2,
-                    restructure_analysis)
+                    convert_df_to_json_list_v2)
 
 class Prompt:
 
@@ -73,13 +72,15 @@ class Prompt:
         return prompt
 
 
-    def build_case_studies(self, case_type):
+    def select_case_studies(self, case_type):
+        """Articles of the selected publisher to present as case studies of the type"""
+        return sort_and_filter_by_case_type(self.data, case_type)
 
-        # Filter out articles that do not fit the specified case type
-        df = sort_and_filter_by_case_type(self.data, case_type)
 
-        # Refine n examples and resample the dataframe
-        article_json = convert_df_to_json_list_v2(df, case_type)
+    def build_case_studies(self, case_type, cases):
+
+        # cases are from select_case_studies(), with their case_study_summary attached
+        article_json = convert_df_to_json_list_v2(cases, case_type)
 
         base_prompt = f"""[SECTION: CASE STUDIES]
         1. You will be provided the details of the analysis of a news article, containing the headline, bias category and analysis. 
@@ -107,7 +108,7 @@ class Prompt:
 
         prompt_list = []
         for n, article in enumerate(article_json):
-            analysis = restructure_analysis(article['analysis'], case_type)
+            analysis = article['summary']
             prompt_details = f"HEADLINE: {article['headline']}\n" \
                     f"BIAS CATEGORY: {article['bias_category']}\n" \
                     f"BIAS CATEGORY SCORE: {article['bias_category_score']}\n" \
@@ -2,6 +2,7 @@ import json
 import pandas as pd
 
 from .exceptions import PromptError
+from utils.case_studies import CASE_TYPE_COLUMNS
 
 
 def filter_dataset(df, **kwargs):
@@ -110,14 +111,8 @@ def sort_and_filter_by_case_type(df, case_type):
 
     
 def convert_df_to_json_list_v2(df, case_type):
-    case_dict = {
-        'Misrepresentation': 'misrepresentation',
-        'Negative Behaviour': 'negative_aspects',
-        'Due Prominence': 'omit_due_prominence',
-        'Generalisation': 'generalisation',
-        'Imagery and Headlines': 'headline_bias'
-    }
-    case_type = case_dict[case_type]
+    """Case study articles as dicts, df must already have their case_study_summary column"""
+    case_type = CASE_TYPE_COLUMNS[case_type]
 
     json_list = []
     for _, row in df.iterrows():
@@ -125,43 +120,9 @@ def convert_df_to_json_list_v2(df, case_type):
         row_dict['headline'] = row['headline']
         row_dict['bias_category'] = case_type
         row_dict['bias_category_score'] = row[case_type]
-        row_dict['analysis'] = row[f'{case_type}_analysis']
+        row_dict['summary'] = row['case_study_summary']
         row_dict['bias_rating'] = row['bias_rating']
 
         json_list.append(row_dict)
 
     return json_list
-
-
-def restructure_analysis(analysis, case_type):
-    """Remove details of the analysis that is not relevant to the case type"""
-
-    category_map = {
-        'Generalisation': 'Category 1',
-        'Negative Behaviour': 'Category 2',
-        'Misrepresentation': 'Category 3',
-        'Due Prominence': 'Category 4',
-        'Imagery and Headlines': 'Category 5'
-        }
-    category = category_map[case_type]
-
-    # allowed_sections = ['# Executive Summary', '# Analysis', '# Overall Assessment', '# Recommendations'] + ['## ' + category]
-    allowed_sections = ['# Executive Summary'] + ['## ' + category]
-    
-    tag_list = []
-    analysis_lines = []
-    analysis = analysis.split('\n')
-    
-    for line in analysis:
-        if len(line) > 0:
-            if line[0] == '#':
-                tag = line
-        else:
-            pass
-
-        tag_list.append(tag)
-        if any(list(map(lambda x: x in tag, allowed_sections))):
-            analysis_lines.append(line)
-
-    restructured_analysis = '\n'.join(analysis_lines)
-    return restructured_analysis
\ No newline at end of file
@@ -0,0 +1,95 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', 500))
+
+
+class RateLimiter:
+    """Spaces request starts at least 60 / requests_per_minute seconds apart"""
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60 / requests_per_minute if requests_per_minute > 0 else 0
+        self._next_start = 0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class PromptScheduler:
+    """Sends prompts concurrently, each one as soon as the turns it depends on are answered
+
+    Requests are (name, prompt, depends_on) tuples. A prompt is sent with the system
+    prompt and the turns of the requests it depends on as its conversation, so
+    independent prompts can be in flight at the same time while e.g. the conclusions
+    wait for the analyses they summarize. At most max_concurrency requests are in flight
+    and at most requests_per_minute are started per minute.
+    """
+
+    def __init__(self, api_handler, max_concurrency=LLM_MAX_CONCURRENCY, requests_per_minute=LLM_REQUESTS_PER_MINUTE):
+        self.api_handler = api_handler
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+
+    def __check(self, requests):
+        names = [name for name, _, _ in requests]
+        if len(names) != len(set(names)):
+            raise ValueError('Request names must be unique')
+
+        # Dependencies must be requested before their dependents, which also rules out cycles
+        seen = set()
+        for name, _, depends_on in requests:
+            unknown = [d for d in depends_on if d not in seen]
+            if len(unknown) > 0:
+                raise ValueError(f'Request {name} depends on {unknown}, which are not requested before it')
+            seen.add(name)
+
+    async def __run(self, requests):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = RateLimiter(self.requests_per_minute)
+        prompts = {name: prompt for name, prompt, _ in requests}
+        tasks = dict()
+
+        async def send(name, prompt, depends_on):
+            # Wait for the turns this prompt builds on
+            history = []
+            for dependency in depends_on:
+                history.append((prompts[dependency], await tasks[dependency]))
+
+            async with semaphore:
+                await limiter.wait()
+                return await asyncio.to_thread(self.api_handler.complete, prompt, history)
+
+        for name, prompt, depends_on in requests:
+            tasks[name] = asyncio.ensure_future(send(name, prompt, depends_on))
+
+        responses = await asyncio.gather(*tasks.values())
+        return dict(zip(tasks.keys(), responses))
+
+    async def run_async(self, requests):
+        """Send all requests from a running event loop and return their responses by name"""
+        requests = [(name, prompt, list(depends_on)) for name, prompt, depends_on in requests]
+        self.__check(requests)
+        if len(requests) == 0:
+            return dict()
+        return await self.__run(requests)
+
+    def run(self, requests):
+        """Send all requests and return their responses by name"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.run_async(requests))
+
+        # Called from a running event loop (a notebook or an async host), where asyncio.run()
+        # fails, so the requests are sent from a loop of their own in a worker thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.run_async(requests)).result()
@@ -1,6 +1,9 @@
 from .utils import count_levels
-from pptx import Presentation
+from .template import template_cache, LAYOUTS
 from pptx import util
+from pptx.chart.data import CategoryChartData
+from pptx.dml.color import RGBColor
+from pptx.enum.chart import XL_CHART_TYPE, XL_LEGEND_POSITION
 from datetime import date, datetime
 import json
 
@@ -61,9 +64,12 @@ class Prs:
         }
     }
     """
-    def __init__(self, pptx_template_filepath, factory_json=None, placeholder_json=None):
-        # Initialize PPT template
-        self.prs = Presentation(pptx_template_filepath)
+    def __init__(self, pptx_template_filepath, factory_json=None, placeholder_json=None, artifact_store=None):
+        # Initialize PPT template, a fresh copy of the template read and checked once per process
+        self.prs = template_cache.presentation(pptx_template_filepath)
+
+        # Chart files named in factory_json are read from the report's artifact store if given
+        self.artifact_store = artifact_store
 
         # Convert png + LLM json results into a dict
         factory_dict = None
@@ -81,18 +87,8 @@ class Prs:
             if d is not None:
                 self.content_dict.update(d)
 
-        # Slide type indicator --
-        # This will change whenever slide master of PPTX template is changed
-        self.layout_dict = {
-            'Title': 0,
-            'Section': 1,
-            'Title, Text': 2,
-            'Title, Content': 3,
-            'Title, Text, Content, Picture': 4,
-            'Title, Content, Picture': 5,
-            'Title, Picture, Picture': 6,
-            'Blank': 7
-        }
+        # Slide type indicator -- see template.py
+        self.layout_dict = LAYOUTS
 
     class AdjustedPicture:
         """Fits picture into the container size in the PPT slide"""
@@ -189,7 +185,87 @@ class Prs:
         return self.prs
 
 
-    def _render_chartbullets_slide(self, title='', chart_title='', chart_filepath='', bullets=''):
+    def _open_artifact(self, filepath):
+        """File object of an artifact of the report, or the path itself without an artifact store"""
+        if self.artifact_store is None:
+            return filepath
+        return self.artifact_store.open(filepath)
+
+    def __rgb(self, color):
+        return RGBColor.from_string(color.lstrip('#').upper())
+
+    def _insert_native_chart(self, slide, placeholder, chart_data):
+        """Draw chart_data (see ChartBuilder.build_*_data) as a PowerPoint chart or table in place of the placeholder"""
+        x, y, cx, cy = placeholder.left, placeholder.top, placeholder.width, placeholder.height
+        placeholder._element.getparent().remove(placeholder._element)
+
+        if chart_data['type'] == 'table':
+            return self.__insert_table(slide, x, y, cx, cy, chart_data)
+
+        category_data = CategoryChartData(number_format=chart_data['number_format'])
+        category_data.categories = chart_data['categories']
+        for series in chart_data['series']:
+            category_data.add_series(series['name'], series['values'])
+
+        chart = slide.shapes.add_chart(XL_CHART_TYPE.BAR_CLUSTERED, x, y, cx, cy, category_data).chart
+        chart.font.size = util.Pt(10)
+        chart.font.color.rgb = self.__rgb('#474948')
+        chart.plots[0].gap_width = 60
+        chart.value_axis.has_major_gridlines = False
+        for axis, axis_title in [(chart.value_axis, chart_data['value_axis_title']),
+                                 (chart.category_axis, chart_data['category_axis_title'])]:
+            axis.has_title = True
+            axis.axis_title.text_frame.text = axis_title
+            axis.axis_title.text_frame.paragraphs[0].runs[0].font.size = util.Pt(12)
+            axis.axis_title.text_frame.paragraphs[0].runs[0].font.bold = True
+
+        chart.has_legend = len(chart_data['series']) > 1
+        if chart.has_legend:
+            chart.legend.position = XL_LEGEND_POSITION.TOP
+            chart.legend.include_in_layout = False
+
+        for series, series_data in zip(chart.plots[0].series, chart_data['series']):
+            if 'color' in series_data:
+                series.format.fill.solid()
+                series.format.fill.fore_color.rgb = self.__rgb(series_data['color'])
+            for n, label in enumerate(series_data['labels']):
+                point = series.points[n]
+                if 'colors' in series_data:
+                    point.format.fill.solid()
+                    point.format.fill.fore_color.rgb = self.__rgb(series_data['colors'][n])
+                # python-pptx adds no run for empty text, and there is nothing to label
+                if label == '':
+                    continue
+                point.data_label.text_frame.text = label
+                point.data_label.text_frame.paragraphs[0].runs[0].font.size = util.Pt(8)
+
+        return chart
+
+    def __insert_table(self, slide, x, y, cx, cy, chart_data):
+        columns = chart_data['columns']
+        rows = chart_data['rows']
+        table = slide.shapes.add_table(len(rows) + 1, len(columns) + 1, x, y, cx, cy).table
+
+        header = [chart_data['row_title']] + columns
+        for n, text in enumerate(header):
+            table.cell(0, n).text = text
+        for r, row in enumerate(rows, start=1):
+            table.cell(r, 0).text = row['name']
+            for c, (label, color) in enumerate(zip(row['labels'], row['colors']), start=1):
+                cell = table.cell(r, c)
+                cell.text = label
+                cell.fill.solid()
+                cell.fill.fore_color.rgb = self.__rgb(color)
+
+        for row in table.rows:
+            for cell in row.cells:
+                for paragraph in cell.text_frame.paragraphs:
+                    for run in paragraph.runs:
+                        run.font.size = util.Pt(9)
+
+        return table
+
+    def _render_chartbullets_slide(self, title='', chart_title='', chart_filepath='', bullets='', chart_data=None):
         slide_layout = self.prs.slide_layouts[self.layout_dict['Title, Text, Content, Picture']]
         slide = self.prs.slides.add_slide(slide_layout)
 
@@ -202,8 +278,11 @@ class Prs:
         placeholder = slide.placeholders[13]
         
         if chart_filepath != '':
-            picture = placeholder.insert_picture(chart_filepath)
+            picture = placeholder.insert_picture(self._open_artifact(chart_filepath))
             picture_adj = self.AdjustedPicture(picture).fit_to_container()
+        elif chart_data is not None:
+            # No image was rendered, draw the chart natively
+            self._insert_native_chart(slide, placeholder, chart_data)
 
         return self.prs
 
@@ -346,7 +425,8 @@ class Prs:
                 chart_title = d['chart_title']
                 chart_filepath = d['chart_filepath']
                 bullets = d['bullets']
-                self.prs = self._render_chartbullets_slide(title, chart_title, chart_filepath, bullets)
+                self.prs = self._render_chartbullets_slide(title, chart_title, chart_filepath, bullets,
+                                                           d.get('chart_data'))
 
             elif count_levels(d) > 1:
                 for k, v in d.items():
@@ -354,7 +434,8 @@ class Prs:
                     chart_title = v['chart_title']
                     chart_filepath = v['chart_filepath']
                     bullets = v['bullets']
-                    self.prs = self._render_chartbullets_slide(title, chart_title, chart_filepath, bullets)       
+                    self.prs = self._render_chartbullets_slide(title, chart_title, chart_filepath, bullets,
+                                                               v.get('chart_data'))
         else:
             self.prs = self._render_chartbullets_slide(title, chart_title, chart_filepath, bullets)
 
@@ -371,7 +452,8 @@ class Prs:
                 chart_title = d['chart_title']
                 chart_filepath = d['chart_filepath']
                 bullets = d['bullets']
-                self.prs = self._render_chartbullets_slide(title, chart_title, chart_filepath, bullets)
+                self.prs = self._render_chartbullets_slide(title, chart_title, chart_filepath, bullets,
+                                                           d.get('chart_data'))
 
             elif count_levels(d) > 1:
                 for k, v in d.items():
@@ -379,7 +461,8 @@ class Prs:
                     chart_title = v['chart_title']
                     chart_filepath = v['chart_filepath']
                     bullets = v['bullets']
-                    self.prs = self._render_chartbullets_slide(title, chart_title, chart_filepath, bullets)       
+                    self.prs = self._render_chartbullets_slide(title, chart_title, chart_filepath, bullets,
+                                                               v.get('chart_data'))
         else:
             self.prs = self._render_chartbullets_slide(title, chart_title, chart_filepath, bullets)
 
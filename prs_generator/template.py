@@ -0,0 +1,98 @@
+"""PPTX template shared by every report of a process
+
+The template file is read and checked once, the first time it is used (or ahead of
+the first report with template_cache.load()), and each report gets a presentation of
+its own opened from the cached bytes. A template whose slide master no longer has the
+layouts or placeholders Prs fills in fails there, instead of halfway through a report.
+"""
+import io
+import os
+import threading
+from pptx import Presentation
+
+# Slide type -> index of its layout in the slide master of the template
+# This will change whenever slide master of PPTX template is changed
+LAYOUTS = {
+    'Title': 0,
+    'Section': 1,
+    'Title, Text': 2,
+    'Title, Content': 3,
+    'Title, Text, Content, Picture': 4,
+    'Title, Content, Picture': 5,
+    'Title, Picture, Picture': 6,
+    'Blank': 7
+}
+
+# Slide type -> placeholder indices filled in by the Prs._render_*_slide methods
+LAYOUT_PLACEHOLDERS = {
+    'Title': [0, 1],
+    'Section': [0, 1],
+    'Title, Text': [0, 1],
+    'Title, Content': [0, 4],
+    'Title, Text, Content, Picture': [0, 1, 4, 13],
+    'Title, Content, Picture': [0, 2, 13]
+}
+
+
+def validate_template(prs):
+    """Problems of a presentation as a template for Prs, an empty list if there are none"""
+    problems = []
+    slide_layouts = list(prs.slide_layouts)
+
+    for slide_type, placeholders in LAYOUT_PLACEHOLDERS.items():
+        index = LAYOUTS[slide_type]
+        if index >= len(slide_layouts):
+            problems.append(f'no layout {index} for {slide_type!r} slides')
+            continue
+
+        layout = slide_layouts[index]
+        available = {placeholder.placeholder_format.idx for placeholder in layout.placeholders}
+        missing = [idx for idx in placeholders if idx not in available]
+        if len(missing) > 0:
+            problems.append(f'layout {index} ({layout.name!r}) for {slide_type!r} slides '
+                            f'has no placeholder {", ".join(map(str, missing))}')
+
+    return problems
+
+
+class TemplateCache:
+    """Bytes of checked templates by path, reloaded when the file changes"""
+
+    def __init__(self):
+        self._templates = dict()
+        self._lock = threading.Lock()
+
+    def __signature(self, path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self, path):
+        """Bytes of the template, read and validated on first use"""
+        signature = self.__signature(path)
+        key = os.path.abspath(path)
+
+        with self._lock:
+            cached = self._templates.get(key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            problems = validate_template(Presentation(io.BytesIO(data)))
+            if len(problems) > 0:
+                raise ValueError(f'Template {path} does not fit the briefing pack slides: ' + '; '.join(problems))
+
+            self._templates[key] = (signature, data)
+            return data
+
+    def presentation(self, path):
+        """New presentation of the template, for one report"""
+        return Presentation(io.BytesIO(self.load(path)))
+
+    def clear(self):
+        with self._lock:
+            self._templates = dict()
+
+
+template_cache = TemplateCache()
@@ -2,13 +2,18 @@ import streamlit as st
 import pandas as pd
 from utils.query import (initialize_parameter_query,
                          build_query,
+                         has_articles,
                          execute_query_to_dataframe,
-                         export_query_params_to_json)
+                         load_topic_bridge,
+                         export_query_params_to_json,
+                         STAGE_COLUMNS)
 from briefbuilder.components import ReportComponentFactory
-from prs_generator.generator import Prs
+from briefbuilder.pack import write_pack, TEMPLATE_PATH
+from prs_generator.template import template_cache
+from data_generator.render import render_service
+from utils.artifacts import report_files
+from utils.report_store import report_store
 from datetime import date
-import json
-from io import BytesIO
 import streamlit.components.v1 as components
 
 
@@ -16,6 +21,13 @@ import streamlit.components.v1 as components
 # Determine the constraints to be set by the application based on the articles in the database and set categories
 
 query_constraints = initialize_parameter_query()
+
+# Chart workers start up while the parameters are being picked
+render_service.start()
+
+# Read and check the slide template once, ahead of the first report
+template_cache.load(TEMPLATE_PATH)
+
 query_constraints['bias_category'] = [
             'Generalizing Claims',
             'Omit Due Prominence',
@@ -38,6 +50,14 @@ if 'run' not in st.session_state:
 if 'result' not in st.session_state:
     st.session_state.result = None
 
+# Reference of the finished pack in the report file store, kept across reruns
+if 'report_ref' not in st.session_state:
+    st.session_state.report_ref = None
+
+# (report_ref, bytes) of the pack offered for download, read from the store once per pack
+if 'report_bytes' not in st.session_state:
+    st.session_state.report_bytes = (None, None)
+
 ## APP COMPONENTS
 
 def select_publisher():
@@ -148,7 +168,7 @@ def select_sections():
     sections = selection_1 + selection_2 + selection_3 + selection_4
     return sections
 
-def prepare_data(selected_publisher, start_date, end_date, compared_publishers, bias_category, topics, partial_query):
+def prepare_data(selected_publisher, start_date, end_date, compared_publishers, bias_category, topics, partial_query, stage='report'):
     dict_params = export_query_params_to_json(
         selected_publisher,
         start_date,
@@ -162,12 +182,14 @@ def prepare_data(selected_publisher, start_date, end_date, compared_publishers,
                 compared_publishers,
                 bias_category,
                 topics,
-                partial_query=partial_query)
+                partial_query=partial_query,
+                columns=STAGE_COLUMNS[stage])
     df = execute_query_to_dataframe(sql)
 
-    if not partial_query:
+    if not partial_query and stage == 'report':
         st.session_state['df'] = df
         st.session_state['params'] = dict_params
+        st.session_state['topic_bridge'] = load_topic_bridge(sql)
 
     return df
 
@@ -197,10 +219,12 @@ if btn_preview:
         bias_category,
         topics
     )
-    if ('df' not in st.session_state or
-        st.session_state['params'] is not dict_params):
-        del st.session_state['result']
-        # Perform partial query
+    # Query results are cached per selection, so rerunning the preview is cheap
+    if st.session_state.get('params') != dict_params:
+        st.session_state['result'] = None
+
+    # Probe for the selected publisher first, then fetch only the columns shown in the preview
+    if has_articles(selected_publisher, start_date, end_date):
         df = prepare_data(
             selected_publisher,
             start_date,
@@ -208,28 +232,18 @@ if btn_preview:
             compared_publishers,
             bias_category,
             topics,
-            partial_query=True
+            partial_query=False,
+            stage='preview'
         )
+        publisher_counts = df['publisher'].value_counts()
+        st.success(f'{len(df)} articles retrieved ('
+                   + ', '.join([f'{k}: {v}' for k, v in publisher_counts.items()]) + ').')
+        st.dataframe(df)
 
-        if len(df) > 0:
-            df = prepare_data(
-                selected_publisher,
-                start_date,
-                end_date,
-                compared_publishers,
-                bias_category,
-                topics,
-                partial_query=False
-            )
-            st.success(f'{len(df)} articles retrieved.')
-            df = df[['publish_date', 'publisher', 'headline']]
-            st.dataframe(df)
-        
-        else:
-            st.error('Invalid request. No articles retrieved for the chosen publisher during the specified time period. '
-                    'Try expanding your search criteria.')
+    else:
+        st.error('Invalid request. No articles retrieved for the chosen publisher during the specified time period. '
+                'Try expanding your search criteria.')
 
-binary_output  = BytesIO()
 if st.session_state.run:
     result_container.empty()
     with st.empty():
@@ -248,7 +262,7 @@ if st.session_state.run:
             dict_params = st.session_state['params']
             df = st.session_state['df']
             progress_container.progress(30, text="Generating charts and captions...(Task 2 of 3)")
-            rcf = ReportComponentFactory(dict_params, df)
+            rcf = ReportComponentFactory(dict_params, df, st.session_state['topic_bridge'])
         # try:
             rcf.run()
         # except:
@@ -257,30 +271,27 @@ if st.session_state.run:
         # else:
             dict_rcf = rcf.results
             st.session_state.result = dict_rcf
-            factory_json = json.dumps(dict_rcf)
             progress_container.progress(60, text="Creating slides...(Task 3 or 3)")
-            prs = Prs('template.pptx', factory_json)
-            prs.add_Title_section('Briefing Pack', [start_date, end_date])
-            prs.add_Introduction_section('Introduction', 'Placeholder text')
-            prs.add_Methodology_section(use_json=True)
-            prs.add_KeyFindings_section(use_json=True)
-            prs.add_PublisherPerformance_section(use_json=True)
-            prs.add_PublisherComparison_section(use_json=True)
-            prs.add_UseCases_section(use_json=True)
-            prs.add_Conclusion_section(use_json=True)
-            prs.add_Recommendations_section('Recommendations', 'Placeholder text')
-            prs.save(binary_output)
+            st.session_state.report_ref = write_pack(dict_rcf, start_date, end_date, artifact_store=rcf.artifact_store)
+            # Kept as a draft, to be reopened from the retriever pages
+            report_store.save(dict_params, dict_rcf, rcf.artifact_store, st.session_state.report_ref,
+                              components=rcf.component_states)
+            rcf.artifact_store.close()
             progress_container.progress(100, text="Done!")
 
     st.session_state.run = False
 
-if 'result' in st.session_state and st.session_state['result'] is not None:
+if st.session_state['result'] is not None and st.session_state.report_ref in report_files:
     progress_container.empty()
+    if st.session_state.report_bytes[0] != st.session_state.report_ref:
+        # Streamlit keeps the download in memory either way, read it once rather than every rerun
+        with report_files.open(st.session_state.report_ref) as report_file:
+            st.session_state.report_bytes = (st.session_state.report_ref, report_file.read())
     with result_container.container():
         st.success("Done! Click the button below to download")
         st.download_button(
             label = 'Download Report',
-            data = binary_output.getvalue(),
+            data = st.session_state.report_bytes[1],
             file_name = f'report_{date.today().strftime("%m%d%y")}.pptx'
         )
 else:
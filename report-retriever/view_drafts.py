@@ -1,3 +1,84 @@
 import streamlit as st
+from briefbuilder.pack import open_stored_pack
+from briefbuilder.rebuild import rebuild_report
+from utils.artifacts import report_files
+from utils.report_store import report_store
 
-st.title('View Drafts')
\ No newline at end of file
+## APP COMPONENTS
+
+def select_filters():
+    col1, col2, col3 = st.columns(spec=3, gap='large')
+    publisher = col1.selectbox(label='Publisher', options=['All'] + report_store.publishers('draft'),
+                               key='drafts_publisher')
+    start_date = col2.date_input(label='Covering from', value=None, key='drafts_start_date')
+    end_date = col3.date_input(label='Covering to', value=None, key='drafts_end_date')
+
+    publisher = None if publisher == 'All' else publisher
+    # Typecast to SQL readable format
+    start_date = None if start_date is None else start_date.strftime('%Y-%m-%d')
+    end_date = None if end_date is None else end_date.strftime('%Y-%m-%d')
+    return publisher, start_date, end_date
+
+def publish(report_id):
+    report_store.publish(report_id)
+
+def delete(report_id):
+    report_files.delete(report_store.delete(report_id))
+    st.session_state.get('pack_bytes', {}).pop(report_id, None)
+
+def rebuild(report_id):
+    # Unchanged sections are taken over from the draft, the others are built again
+    with st.spinner('Rebuilding report. Please do not close this page.'):
+        _, rebuilt = rebuild_report(report_id, st.session_state[f'rebuild_{report_id}'])
+    st.session_state['rebuilt'] = rebuilt
+
+def prepare_download(report_id):
+    # Packs are only read (or laid out again) when asked for, not on every rerun of the listing
+    with open_stored_pack(report_id) as report_file:
+        st.session_state.setdefault('pack_bytes', {})[report_id] = report_file.read()
+
+def show_draft(report):
+    label = (f"{report['publisher']}, {report['start_date']} to {report['end_date']} "
+             f"(created {report['created_at'].replace('T', ' ')})")
+    with st.expander(label):
+        st.markdown('Compared with: ' + (', '.join(report['compared_publishers']) or 'none'))
+
+        col1, col2, col3 = st.columns(spec=3)
+        pack_bytes = st.session_state.get('pack_bytes', {}).get(report['report_id'])
+        if pack_bytes is None:
+            col1.button('Prepare Download', on_click=prepare_download, args=(report['report_id'],),
+                        key=f"prepare_{report['report_id']}")
+        else:
+            col1.download_button(
+                label='Download Report',
+                data=pack_bytes,
+                file_name=f"report_{report['publisher']}_{report['start_date']}_{report['end_date']}.pptx",
+                key=f"download_{report['report_id']}"
+            )
+        col2.button('Publish', on_click=publish, args=(report['report_id'],), key=f"publish_{report['report_id']}")
+        col3.button('Delete', on_click=delete, args=(report['report_id'],), key=f"delete_{report['report_id']}")
+
+        st.multiselect('Sections to build again, besides those whose data changed', [
+            'Report Parameters',
+            'Case Studies',
+            'Publisher Performance Overview',
+            'Publisher Comparison',
+            'Conclusions',
+            'Key Findings'
+        ], key=f"rebuild_{report['report_id']}")
+        st.button('Rebuild as new draft', on_click=rebuild, args=(report['report_id'],),
+                  key=f"rebuild_button_{report['report_id']}")
+
+st.title('View Drafts')
+publisher, start_date, end_date = select_filters()
+
+if st.session_state.get('rebuilt') is not None:
+    st.success('Saved the rebuilt report as a new draft. Built again: '
+               + (', '.join(st.session_state['rebuilt']) or 'nothing, no section had changed') + '.')
+    st.session_state['rebuilt'] = None
+
+drafts = report_store.find(publisher, start_date, end_date, status='draft')
+if len(drafts) == 0:
+    st.info('No drafts found. Generated reports are kept here until they are published.')
+for report in drafts:
+    show_draft(report)
@@ -1,3 +1,50 @@
 import streamlit as st
+from briefbuilder.pack import open_stored_pack
+from utils.report_store import report_store
 
-st.title('View Published Reports')
\ No newline at end of file
+## APP COMPONENTS
+
+def select_filters():
+    col1, col2, col3 = st.columns(spec=3, gap='large')
+    publisher = col1.selectbox(label='Publisher', options=['All'] + report_store.publishers('published'),
+                               key='published_publisher')
+    start_date = col2.date_input(label='Covering from', value=None, key='published_start_date')
+    end_date = col3.date_input(label='Covering to', value=None, key='published_end_date')
+
+    publisher = None if publisher == 'All' else publisher
+    # Typecast to SQL readable format
+    start_date = None if start_date is None else start_date.strftime('%Y-%m-%d')
+    end_date = None if end_date is None else end_date.strftime('%Y-%m-%d')
+    return publisher, start_date, end_date
+
+def prepare_download(report_id):
+    # Packs are only read (or laid out again) when asked for, not on every rerun of the listing
+    with open_stored_pack(report_id) as report_file:
+        st.session_state.setdefault('pack_bytes', {})[report_id] = report_file.read()
+
+def show_published_report(report):
+    label = (f"{report['publisher']}, {report['start_date']} to {report['end_date']} "
+             f"(published {report['published_at'].replace('T', ' ')})")
+    with st.expander(label):
+        st.markdown('Compared with: ' + (', '.join(report['compared_publishers']) or 'none'))
+
+        pack_bytes = st.session_state.get('pack_bytes', {}).get(report['report_id'])
+        if pack_bytes is None:
+            st.button('Prepare Download', on_click=prepare_download, args=(report['report_id'],),
+                      key=f"prepare_{report['report_id']}")
+        else:
+            st.download_button(
+                label='Download Report',
+                data=pack_bytes,
+                file_name=f"report_{report['publisher']}_{report['start_date']}_{report['end_date']}.pptx",
+                key=f"download_{report['report_id']}"
+            )
+
+st.title('View Published Reports')
+publisher, start_date, end_date = select_filters()
+
+reports = report_store.find(publisher, start_date, end_date, status='published')
+if len(reports) == 0:
+    st.info('No published reports found. Reports are published from the drafts page.')
+for report in reports:
+    show_published_report(report)
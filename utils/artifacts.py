@@ -0,0 +1,268 @@
+"""Storage for the files a report is built from, such as chart images
+
+Every report gets a store of its own, so reports built at the same time in one process
+never see each other's files. Components put artifacts by name, the report schema refers
+to them by that name and Prs reads them back through the same store.
+
+ARTIFACT_STORE picks the kind of store made by create_artifact_store():
+
+    memory   artifacts are kept in memory (default)
+    tempdir  artifacts are written to a temporary directory removed with the store
+    content  artifacts are written once per content to ARTIFACT_DIR (default artifacts/),
+             identical files of different reports are shared. Files no open store
+             refers to are evicted least recently used first beyond ARTIFACT_MAX_MB
+             (default 500)
+
+Finished packs outlive the report they were built for and go to the report file store
+in REPORT_DIR (default reports/), where they are kept by reference until deleted.
+"""
+import os
+import io
+import uuid
+import hashlib
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+ARTIFACT_STORE = os.getenv('ARTIFACT_STORE', 'memory')
+ARTIFACT_DIR = os.getenv('ARTIFACT_DIR', 'artifacts')
+ARTIFACT_MAX_MB = float(os.getenv('ARTIFACT_MAX_MB', 500))
+REPORT_DIR = os.getenv('REPORT_DIR', 'reports')
+
+# Blob path -> number of names referring to it in the open content stores of the process
+_blob_references = Counter()
+_blob_lock = threading.Lock()
+
+
+def _release(path):
+    """Drop one reference to a blob, called with _blob_lock held"""
+    _blob_references[path] -= 1
+    if _blob_references[path] <= 0:
+        del _blob_references[path]
+
+
+class MemoryArtifactStore:
+    """Artifacts of one report, kept in memory"""
+
+    def __init__(self):
+        self._artifacts = dict()
+        self._lock = threading.Lock()
+
+    def put(self, name, data):
+        with self._lock:
+            self._artifacts[name] = data
+        return name
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._artifacts:
+                raise KeyError(f'No artifact named {name!r}')
+            return self._artifacts[name]
+
+    def open(self, name):
+        """Binary file object of the artifact, for readers expecting a file"""
+        return io.BytesIO(self.get(name))
+
+    def names(self):
+        with self._lock:
+            return list(self._artifacts.keys())
+
+    def close(self):
+        with self._lock:
+            self._artifacts = dict()
+
+
+class TempDirArtifactStore:
+    """Artifacts of one report, written to a temporary directory of their own"""
+
+    def __init__(self):
+        self._dir = tempfile.TemporaryDirectory(prefix='report-')
+        self.root = self._dir.name
+
+    def path(self, name):
+        return os.path.join(self.root, os.path.basename(name))
+
+    def put(self, name, data):
+        with open(self.path(name), 'wb') as f:
+            f.write(data)
+        return name
+
+    def get(self, name):
+        try:
+            with open(self.path(name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(f'No artifact named {name!r}')
+
+    def open(self, name):
+        return io.BytesIO(self.get(name))
+
+    def names(self):
+        return sorted(os.listdir(self.root))
+
+    def close(self):
+        self._dir.cleanup()
+
+
+class ContentArtifactStore:
+    """Artifacts of one report, stored by content hash in a directory shared by all reports
+
+    Names are mapped to the hashes of their content, so a file that is the same in many
+    reports (e.g. an unchanged chart) is stored once. The directory is kept under
+    max_bytes by evicting the least recently used files, never one that an open store
+    of the process still refers to.
+    """
+
+    def __init__(self, root=ARTIFACT_DIR, max_bytes=ARTIFACT_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._hashes = dict()
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def __write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write under a temporary name first, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def __evict(self):
+        entries = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if _blob_references[path] > 0:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Evicted by another process in the meantime
+                pass
+            total -= size
+
+    def put(self, name, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+
+        with _blob_lock:
+            try:
+                # Already stored, mark it as recently used
+                os.utime(path)
+            except FileNotFoundError:
+                self.__write(path, data)
+
+            with self._lock:
+                previous = self._hashes.get(name)
+                self._hashes[name] = digest
+            _blob_references[path] += 1
+            if previous is not None:
+                _release(self.blob_path(previous))
+
+            self.__evict()
+        return name
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._hashes:
+                raise KeyError(f'No artifact named {name!r}')
+            digest = self._hashes[name]
+        with open(self.blob_path(digest), 'rb') as f:
+            return f.read()
+
+    def open(self, name):
+        return io.BytesIO(self.get(name))
+
+    def names(self):
+        with self._lock:
+            return list(self._hashes.keys())
+
+    def close(self):
+        # Blobs may be shared with other reports, they are left for eviction
+        with self._lock:
+            digests, self._hashes = list(self._hashes.values()), dict()
+        with _blob_lock:
+            for digest in digests:
+                _release(self.blob_path(digest))
+
+
+# Artifact stores by ARTIFACT_STORE value
+ARTIFACT_STORES = {
+    'memory': MemoryArtifactStore,
+    'tempdir': TempDirArtifactStore,
+    'content': ContentArtifactStore,
+}
+
+
+def create_artifact_store(kind=None):
+    """New artifact store for one report, of the kind set by ARTIFACT_STORE unless given"""
+    if kind is None:
+        kind = ARTIFACT_STORE
+    if kind not in ARTIFACT_STORES:
+        raise ValueError(f'ARTIFACT_STORE must be one of {sorted(ARTIFACT_STORES)}, got {kind!r}')
+    return ARTIFACT_STORES[kind]()
+
+
+class ReportFileStore:
+    """Finished report files on disk, by reference
+
+    Files are written once, straight to the store, and read back by the reference
+    returned by new_ref(), e.g. kept in the session of the page that built the report.
+    """
+
+    def __init__(self, root=REPORT_DIR):
+        self.root = root
+
+    def new_ref(self, suffix=''):
+        return uuid.uuid4().hex + suffix
+
+    def path(self, ref):
+        return os.path.join(self.root, os.path.basename(ref))
+
+    @contextmanager
+    def writer(self, ref):
+        """Binary file to write the report to, in place under its reference once closed without error"""
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                yield f
+            os.replace(tmp_path, self.path(ref))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def __contains__(self, ref):
+        return ref is not None and os.path.exists(self.path(ref))
+
+    def open(self, ref):
+        try:
+            return open(self.path(ref), 'rb')
+        except FileNotFoundError:
+            raise KeyError(f'No report file {ref!r}')
+
+    def delete(self, ref):
+        try:
+            os.remove(self.path(ref))
+        except FileNotFoundError:
+            pass
+
+
+report_files = ReportFileStore()
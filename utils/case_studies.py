@@ -0,0 +1,151 @@
+"""Case study summaries of the article analyses
+
+Case study slides show the executive summary of an article's analysis together with the
+section on the bias category the article was picked for. Extracting those sections from
+the long markdown analyses is done once per analysis after a data load:
+
+    python -m utils.case_studies [--db new_cfmm_db.db] [--rebuild]
+
+which stores one summary per (analysis, case type) in the case_study_summaries table
+(see migrations 3 and 5). Each summary keeps a hash of the article id and analysis text
+it was extracted from, analyses updated in place or rowids reused after a delete are
+summarized again, and summaries of deleted analyses are removed. Reports then look the
+summaries up by analysis row and article.
+"""
+import json
+import hashlib
+import argparse
+from datetime import datetime
+
+from .connection import DB_PATH, get_writable_connection
+from .query_builder import REPORT_COLUMNS
+
+# Case type -> report column prefix of its score, tag and analysis
+CASE_TYPE_COLUMNS = {
+    'Misrepresentation': 'misrepresentation',
+    'Negative Behaviour': 'negative_aspects',
+    'Due Prominence': 'omit_due_prominence',
+    'Generalisation': 'generalisation',
+    'Imagery and Headlines': 'headline_bias'
+}
+
+# Case type -> section of the analysis discussing it
+CASE_TYPE_SECTIONS = {
+    'Generalisation': 'Category 1',
+    'Negative Behaviour': 'Category 2',
+    'Misrepresentation': 'Category 3',
+    'Due Prominence': 'Category 4',
+    'Imagery and Headlines': 'Category 5'
+}
+
+# Analyses summarized per transaction
+REFRESH_CHUNK_SIZE = 500
+
+
+def restructure_analysis(analysis, case_type):
+    """Remove details of the analysis that is not relevant to the case type"""
+
+    category = CASE_TYPE_SECTIONS[case_type]
+
+    # allowed_sections = ['# Executive Summary', '# Analysis', '# Overall Assessment', '# Recommendations'] + ['## ' + category]
+    allowed_sections = ['# Executive Summary'] + ['## ' + category]
+
+    tag = ''
+    analysis_lines = []
+    analysis = analysis.split('\n')
+
+    for line in analysis:
+        if len(line) > 0 and line[0] == '#':
+            tag = line
+
+        if any(list(map(lambda x: x in tag, allowed_sections))):
+            analysis_lines.append(line)
+
+    restructured_analysis = '\n'.join(analysis_lines)
+    return restructured_analysis
+
+
+def source_hash(article_id, analysis):
+    """Hash of what a summary is extracted from"""
+    return hashlib.sha256(json.dumps([article_id, analysis]).encode('utf-8')).hexdigest()
+
+
+def summarize_analyses(rows, stored_hashes=None):
+    """(analysis_rowid, article_id, case_type, summary, source_hash) of the analyses whose source changed
+
+    rows are (analysis_rowid, article_id, analysis by case type) tuples and stored_hashes the
+    source_hash of the stored summaries by (analysis_rowid, case_type). Analyses without
+    text are stored with no summary, so that they are not selected again on every refresh.
+    """
+    if stored_hashes is None:
+        stored_hashes = dict()
+
+    summaries = []
+    for analysis_rowid, article_id, analyses in rows:
+        for case_type, analysis in analyses.items():
+            digest = source_hash(article_id, analysis)
+            if stored_hashes.get((analysis_rowid, case_type)) == digest:
+                continue
+            summary = None if analysis is None else restructure_analysis(analysis, case_type)
+            summaries.append((analysis_rowid, article_id, case_type, summary, digest))
+    return summaries
+
+
+def _analysis_select():
+    columns = [REPORT_COLUMNS[f'{prefix}_analysis'] for prefix in CASE_TYPE_COLUMNS.values()]
+    return 'SELECT aa.rowid, aa.article_id, ' + ', '.join(columns) + ' FROM article_analyses aa'
+
+
+def refresh_case_study_summaries(db_path=DB_PATH, rebuild=False):
+    """Summarize the analyses that are new or changed since their summary, or all of them with rebuild
+
+    Run after every data load, once migrations 3 and 5 have created the summary table.
+    Returns the number of analyses summarized.
+    """
+    conn = get_writable_connection(db_path)
+    try:
+        with conn:
+            if rebuild:
+                conn.execute('DELETE FROM case_study_summaries')
+            else:
+                # Summaries of deleted analyses
+                conn.execute('DELETE FROM case_study_summaries '
+                             'WHERE analysis_rowid NOT IN (SELECT rowid FROM article_analyses)')
+
+        rowids = [row[0] for row in conn.execute('SELECT aa.rowid FROM article_analyses aa ORDER BY aa.rowid')]
+
+        sql = _analysis_select() + ' WHERE aa.rowid IN (SELECT value FROM json_each(?))'
+        stored_sql = 'SELECT analysis_rowid, case_type, source_hash FROM case_study_summaries ' \
+                     'WHERE analysis_rowid IN (SELECT value FROM json_each(?))'
+        case_types = list(CASE_TYPE_COLUMNS.keys())
+        refreshed_at = datetime.now().isoformat(timespec='seconds')
+
+        summarized = set()
+        for start in range(0, len(rowids), REFRESH_CHUNK_SIZE):
+            chunk = json.dumps(rowids[start:start + REFRESH_CHUNK_SIZE])
+            rows = [(row[0], row[1], dict(zip(case_types, row[2:]))) for row in conn.execute(sql, (chunk,))]
+            stored_hashes = {(row[0], row[1]): row[2] for row in conn.execute(stored_sql, (chunk,))}
+            summaries = summarize_analyses(rows, stored_hashes)
+
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO case_study_summaries '
+                    '(analysis_rowid, article_id, case_type, summary, source_hash, refreshed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [summary + (refreshed_at,) for summary in summaries]
+                )
+            summarized.update(summary[0] for summary in summaries)
+    finally:
+        conn.close()
+
+    return len(summarized)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute the case study summaries of the article analyses')
+    parser.add_argument('--db', default=DB_PATH, help='Path to the SQLite database')
+    parser.add_argument('--rebuild', action='store_true', help='Summarize all analyses again, not only new and changed ones')
+    args = parser.parse_args()
+
+    count = refresh_case_study_summaries(args.db, args.rebuild)
+    print(f'Summarized {count} analyses')
@@ -0,0 +1,123 @@
+import os
+import atexit
+import sqlite3
+import threading
+from urllib.request import pathname2url
+
+DB_PATH = os.getenv('CFMM_DB_PATH', 'new_cfmm_db.db')
+
+# Memory-map up to 256 MB of the database file and keep a 64 MB page cache per connection
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE_KIB = 64 * 1024
+
+
+class ConnectionPool:
+    """Process-wide pool of read-only SQLite connections, one per thread
+
+    sqlite3 connections cannot be used concurrently, and the Streamlit server runs every
+    script rerun in its own thread, so each thread is handed its own connection. Once the
+    thread exits, its connection (together with its warm page cache) is handed over to
+    the next thread instead of being closed.
+    """
+
+    def __init__(self, db_path=DB_PATH, mmap_size=MMAP_SIZE, cache_size_kib=CACHE_SIZE_KIB):
+        self.db_path = db_path
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._owners = dict()
+        self._wal_enabled = False
+
+    def __enable_wal(self):
+        """Switch the database to WAL so readers never block on a writer
+
+        The journal mode is persisted in the database file, but it can only be changed
+        through a writable connection, so this is done once before any reader is opened.
+        """
+        if self._wal_enabled:
+            return
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+        except sqlite3.OperationalError:
+            # Read-only file system or locked database, readers still work without WAL
+            pass
+        finally:
+            conn.close()
+        self._wal_enabled = True
+
+    def __open(self):
+        uri = f'file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro'
+        # A connection is only ever used by the thread that currently owns it, the flag
+        # lets it be handed over to another thread once its owner has exited
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kib)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def __is_open(self, conn):
+        try:
+            conn.total_changes
+        except sqlite3.ProgrammingError:
+            return False
+        return True
+
+    def __acquire(self):
+        """Reuse the connection of a finished thread, or open a new one"""
+        thread = threading.current_thread()
+        with self._lock:
+            self.__enable_wal()
+            for conn, owner in list(self._owners.items()):
+                if not self.__is_open(conn):
+                    del self._owners[conn]
+                elif not owner.is_alive():
+                    self._owners[conn] = thread
+                    return conn
+
+            conn = self.__open()
+            self._owners[conn] = thread
+            return conn
+
+    def connect(self):
+        """Return the read-only connection owned by the calling thread"""
+        conn = getattr(self._local, 'conn', None)
+
+        # Callers used to close their connections, so reopen if one of them still does
+        if conn is None or not self.__is_open(conn):
+            if not os.path.exists(self.db_path):
+                raise FileNotFoundError(f'Database not found: {self.db_path}')
+            conn = self.__acquire()
+            self._local.conn = conn
+
+        return conn
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._owners:
+                conn.close()
+            self._owners = dict()
+        self._local = threading.local()
+
+
+_pool = ConnectionPool()
+atexit.register(_pool.close_all)
+
+
+def get_connection():
+    """Return a pooled, read-only connection to the CfMM database"""
+    return _pool.connect()
+
+
+def get_writable_connection(db_path=DB_PATH):
+    """Open a new writable connection for maintenance jobs, the caller is responsible for closing it"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    return conn
+
+
+def get_read_only_connection(db_path=DB_PATH):
+    """Open a new read-only connection for maintenance jobs that must not write, the caller closes it"""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f'Database not found: {db_path}')
+    return sqlite3.connect(f'file:{pathname2url(os.path.abspath(db_path))}?mode=ro', uri=True, timeout=30)
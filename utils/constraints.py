@@ -0,0 +1,182 @@
+"""Report parameter constraints (publishers, topics and publication date range)
+
+The parameter page needs these on every rerun, but they only change when new articles
+are loaded. They are precomputed into the parameter_constraints summary table after a
+data load:
+
+    python -m utils.constraints [--db new_cfmm_db.db]
+
+which also bumps the data_version counter (migration 4) that is part of the database
+change token. Loaders that update or delete rows in place must bump it as well, in
+the transaction doing the writes (see bump_data_version). The constraints are cached
+in-process by ConstraintsService until the change token moves.
+"""
+import argparse
+import copy
+import json
+import sqlite3
+import threading
+import warnings
+from datetime import datetime
+
+from .connection import DB_PATH, get_connection, get_writable_connection
+
+# Every part is an index seek (see migration 2), so the token is cheap to read on each rerun.
+# Only moves when rows are added, in-place updates and deletes leave it unchanged.
+LEGACY_CHANGE_TOKEN_SQL = """
+    SELECT (SELECT MAX(created_at) FROM articles),
+           (SELECT MAX(rowid) FROM articles),
+           (SELECT MAX(rowid) FROM article_analyses),
+           (SELECT MAX(rowid) FROM topic_list)
+"""
+
+# The data_version counter of migration 4 moves once per data load. PRAGMA data_version is not
+# used because its value is only comparable within a single connection, while the pool
+# hands out a different connection to each thread and tokens are stored in the database.
+CHANGE_TOKEN_SQL = """
+    SELECT (SELECT MAX(created_at) FROM articles),
+           (SELECT MAX(rowid) FROM articles),
+           (SELECT MAX(rowid) FROM article_analyses),
+           (SELECT MAX(rowid) FROM topic_list),
+           (SELECT version FROM data_version WHERE id = 1)
+"""
+
+
+def has_data_version(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'data_version'"
+    ).fetchone() is not None
+
+
+def bump_data_version(conn):
+    """Move the change token once for a whole data load, however many rows it wrote"""
+    conn.execute('UPDATE data_version SET version = version + 1 WHERE id = 1')
+
+
+def read_change_token(conn):
+    """Token that changes whenever articles, analyses or topics are added or a load bumps data_version"""
+    try:
+        return json.dumps(conn.execute(CHANGE_TOKEN_SQL).fetchone())
+    except sqlite3.OperationalError:
+        # Database without the data_version counter yet, the default filter shows this once
+        warnings.warn('Database has no data_version counter, updates and deletes of existing rows '
+                      'are not noticed by the caches. Run python -m utils.migrations to add it.')
+        return json.dumps(conn.execute(LEGACY_CHANGE_TOKEN_SQL).fetchone())
+
+
+def compute_constraints(conn):
+    """Scan the corpus for the publishers, topics and date range"""
+    cursor = conn.cursor()
+
+    # Generate list of publishers from database
+    pub_query = 'SELECT publisher FROM articles GROUP BY publisher'
+    publishers = [i[0] for i in cursor.execute(pub_query)]
+
+    # Generate list of dates
+    date_query = 'SELECT (SELECT MIN(publish_date) FROM articles) min_date, (SELECT MAX(publish_date) FROM articles) max_date'
+    date_range = [i for i in cursor.execute(date_query)][0]
+
+    topic_query = 'SELECT DISTINCT(topic_name) FROM topic_list'
+    topics = [i[0] for i in cursor.execute(topic_query)]
+
+    cursor.close()
+
+    return {
+        'publishers': publishers,
+        'topics': topics,
+        'date_range': list(date_range)
+    }
+
+
+def read_constraint_summary(conn, token):
+    """Read the precomputed constraints, or None if the summary is missing or stale"""
+    try:
+        rows = conn.execute('SELECT name, value, source_token FROM parameter_constraints').fetchall()
+    except sqlite3.OperationalError:
+        # Summary table has not been created yet (migration 2)
+        return None
+
+    summary = {name: json.loads(value) for name, value, source_token in rows if source_token == token}
+    if set(summary.keys()) != {'publishers', 'topics', 'date_range'}:
+        return None
+
+    return summary
+
+
+def refresh_constraint_summary(db_path=DB_PATH, data_changed=True):
+    """Recompute the constraints and store them in the parameter_constraints table
+
+    Run after every data load so that the parameter page never has to scan the corpus.
+    With data_changed the data_version counter is bumped first, so that caches holding
+    rows updated in place by the load are dropped.
+    """
+    conn = get_writable_connection(db_path)
+    try:
+        if data_changed and has_data_version(conn):
+            with conn:
+                bump_data_version(conn)
+
+        token = read_change_token(conn)
+        constraints = compute_constraints(conn)
+        refreshed_at = datetime.now().isoformat(timespec='seconds')
+
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO parameter_constraints (name, value, source_token, refreshed_at) VALUES (?, ?, ?, ?)',
+                [(name, json.dumps(value), token, refreshed_at) for name, value in constraints.items()]
+            )
+    finally:
+        conn.close()
+
+    return constraints
+
+
+class ConstraintsService:
+    """Process-wide cache of the parameter constraints, invalidated by the change token"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._token = None
+        self._constraints = None
+
+    def __load(self, conn, token):
+        # Prefer the precomputed summary, fall back to scanning the corpus
+        constraints = read_constraint_summary(conn, token)
+        if constraints is None:
+            constraints = compute_constraints(conn)
+        return constraints
+
+    def get(self):
+        conn = get_connection()
+        token = read_change_token(conn)
+
+        with self._lock:
+            if self._constraints is None or token != self._token:
+                self._constraints = self.__load(conn, token)
+                self._token = token
+
+            # Callers add their own keys to the dict, keep the cached copy intact
+            constraints = copy.deepcopy(self._constraints)
+
+        constraints['date_range'] = [datetime.strptime(d, '%Y-%m-%d') for d in constraints['date_range']]
+        return constraints
+
+    def invalidate(self):
+        with self._lock:
+            self._token = None
+            self._constraints = None
+
+
+constraints_service = ConstraintsService()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refresh the precomputed report parameter constraints')
+    parser.add_argument('--db', default=DB_PATH, help='Path to the SQLite database')
+    parser.add_argument('--no-bump', action='store_true',
+                        help='Keep the data_version counter, the data has not changed since the last refresh')
+    args = parser.parse_args()
+
+    constraints = refresh_constraint_summary(args.db, not args.no_bump)
+    print(f"Stored {len(constraints['publishers'])} publishers, {len(constraints['topics'])} topics, "
+          f"date range {constraints['date_range'][0]} to {constraints['date_range'][1]}")
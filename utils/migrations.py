@@ -0,0 +1,235 @@
+"""Schema migrations for the CfMM database
+
+Usage:
+    python -m utils.migrations [--db new_cfmm_db.db] [--dry-run]
+
+Applies pending migrations, refreshes the planner statistics with ANALYZE and prints
+the EXPLAIN QUERY PLAN of the report queries before and after, so that remaining full
+scans of tables and covering indexes are easy to spot. A dry run writes nothing.
+"""
+import os
+import argparse
+from datetime import datetime
+
+from .connection import DB_PATH, get_writable_connection, get_read_only_connection
+from .query_builder import QueryBuilder
+from .constraints import CHANGE_TOKEN_SQL, LEGACY_CHANGE_TOKEN_SQL, has_data_version
+
+# (version, description, statements). Migrations are applied in order and recorded in
+# schema_migrations, so append new ones to the end of the list and never edit old ones.
+MIGRATIONS = [
+    (
+        1,
+        'Indexes for the report dataset query',
+        [
+            # Publisher filter followed by a publish_date range, also serves GROUP BY publisher
+            'CREATE INDEX IF NOT EXISTS idx_articles_publisher_publish_date ON articles(publisher, publish_date)',
+            # Date-only filters and the MIN/MAX(publish_date) lookup of the parameter page
+            'CREATE INDEX IF NOT EXISTS idx_articles_publish_date ON articles(publish_date)',
+            # Join from articles to their analyses
+            'CREATE INDEX IF NOT EXISTS idx_article_analyses_article_id ON article_analyses(article_id)',
+            # Covering index for the topic filter + GROUP_CONCAT subquery and DISTINCT topic_name
+            'CREATE INDEX IF NOT EXISTS idx_topic_list_topic_name_article_id ON topic_list(topic_name, article_id)',
+            # Covering index for per-article topic lookups
+            'CREATE INDEX IF NOT EXISTS idx_topic_list_article_id_topic_name ON topic_list(article_id, topic_name)',
+        ]
+    ),
+    (
+        2,
+        'Parameter constraint summary table',
+        [
+            # Precomputed publishers, topics and date range for the report parameter page
+            """CREATE TABLE IF NOT EXISTS parameter_constraints (
+                name TEXT PRIMARY KEY,
+                value TEXT,
+                source_token TEXT,
+                refreshed_at TEXT
+            )""",
+            # MAX(created_at) is part of the change token checked on every page load
+            'CREATE INDEX IF NOT EXISTS idx_articles_created_at ON articles(created_at)',
+        ]
+    ),
+    (
+        3,
+        'Case study summary table',
+        [
+            # Executive summary and bias category section of each analysis, see utils/case_studies.py
+            """CREATE TABLE IF NOT EXISTS case_study_summaries (
+                analysis_rowid INTEGER NOT NULL,
+                article_id INTEGER,
+                case_type TEXT NOT NULL,
+                summary TEXT,
+                refreshed_at TEXT,
+                PRIMARY KEY (analysis_rowid, case_type)
+            )""",
+        ]
+    ),
+    (
+        4,
+        'Data version counter',
+        [
+            # Bumped once per data load, part of the change token in utils/constraints.py
+            """CREATE TABLE IF NOT EXISTS data_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )""",
+            'INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)',
+        ]
+    ),
+    (
+        5,
+        'Case study summary source hash',
+        [
+            # Hash of the article and analysis a summary was extracted from, see utils/case_studies.py
+            'ALTER TABLE case_study_summaries ADD COLUMN source_hash TEXT',
+        ]
+    ),
+]
+
+
+def ensure_migrations_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT
+        )
+    """)
+
+
+def has_migrations_table(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_migrations'"
+    ).fetchone() is not None
+
+
+def applied_versions(conn, read_only=False):
+    """Versions of the applied migrations, read_only leaves a database without migrations untouched"""
+    if read_only:
+        if not has_migrations_table(conn):
+            return set()
+    else:
+        ensure_migrations_table(conn)
+    return {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+
+def pending_migrations(conn, read_only=False):
+    applied = applied_versions(conn, read_only)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def apply_migrations(conn, migrations):
+    for version, description, statements in migrations:
+        with conn:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute('INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)',
+                         (version, description, datetime.now().isoformat(timespec='seconds')))
+        print(f'Applied migration {version}: {description}')
+
+
+def sample_queries(conn):
+    """Report queries with a representative selection taken from the database itself"""
+    cursor = conn.cursor()
+    publishers = [i[0] for i in cursor.execute(
+        'SELECT publisher FROM articles GROUP BY publisher ORDER BY COUNT(*) DESC LIMIT 3')]
+    start_date, end_date = cursor.execute('SELECT MIN(publish_date), MAX(publish_date) FROM articles').fetchone()
+    topics = [i[0] for i in cursor.execute('SELECT DISTINCT(topic_name) FROM topic_list')]
+    cursor.close()
+
+    report_query = QueryBuilder().build(publishers, start_date, end_date, topics)
+
+    return {
+        'report dataset': (report_query.sql, report_query.params),
+        'publisher list': ('SELECT publisher FROM articles GROUP BY publisher', {}),
+        'date range': ('SELECT (SELECT MIN(publish_date) FROM articles) min_date, (SELECT MAX(publish_date) FROM articles) max_date', {}),
+        'change token': (CHANGE_TOKEN_SQL if has_data_version(conn) else LEGACY_CHANGE_TOKEN_SQL, {}),
+        'topic list': ('SELECT DISTINCT(topic_name) FROM topic_list', {}),
+    }
+
+
+def explain(conn, sql, params):
+    """Return the EXPLAIN QUERY PLAN rows as indented strings"""
+    plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+
+    # Each row is (id, parent, notused, detail), indent details under their parent
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in plan:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+def scan_kind(detail):
+    """'table' or 'covering index' for a plan step reading all rows rather than searching, else None
+
+    A scan of a covering index skips the table rows but still reads every index entry.
+    """
+    detail = detail.strip()
+    if not detail.startswith('SCAN') or 'VIRTUAL TABLE' in detail or 'CONSTANT ROW' in detail:
+        return None
+    if 'COVERING INDEX' in detail:
+        return 'covering index'
+    return 'table'
+
+
+def report_query_plans(conn, queries, label):
+    print(f'\n=== Query plans {label} ===')
+    scans = {'table': 0, 'covering index': 0}
+    for name, (sql, params) in queries.items():
+        print(f'\n[{name}]')
+        for line in explain(conn, sql, params):
+            kind = scan_kind(line)
+            flag = ''
+            if kind is not None:
+                scans[kind] += 1
+                flag = f'  <-- full {kind} scan'
+            print(f'  {line}{flag}')
+    print(f'\nFull scans {label}: {scans["table"] + scans["covering index"]} '
+          f'({scans["table"]} of tables, {scans["covering index"]} of covering indexes)')
+    return scans['table'] + scans['covering index']
+
+
+def migrate(db_path=DB_PATH, dry_run=False):
+    # sqlite3 would create an empty database in place of a mistyped path
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f'Database not found: {db_path}')
+
+    # A dry run only reads, not even the schema_migrations table is created or ANALYZE run
+    conn = get_read_only_connection(db_path) if dry_run else get_writable_connection(db_path)
+    try:
+        queries = sample_queries(conn)
+        report_query_plans(conn, queries, 'before migration')
+
+        migrations = pending_migrations(conn, read_only=dry_run)
+        if dry_run:
+            print('\nPending migrations (dry run, nothing applied):')
+            for version, description, _ in migrations:
+                print(f'  {version}: {description}')
+            if len(migrations) == 0:
+                print('  none')
+            return
+
+        if len(migrations) == 0:
+            print('\nNo pending migrations.')
+        else:
+            print()
+            apply_migrations(conn, migrations)
+
+        # Refresh planner statistics so the new indexes are actually picked
+        conn.execute('ANALYZE')
+        conn.commit()
+
+        report_query_plans(conn, queries, 'after migration')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply CfMM database migrations')
+    parser.add_argument('--db', default=DB_PATH, help='Path to the SQLite database')
+    parser.add_argument('--dry-run', action='store_true', help='Only report the query plans and pending migrations')
+    args = parser.parse_args()
+
+    migrate(args.db, args.dry_run)
@@ -1,96 +1,41 @@
 import pandas as pd
-import sqlite3
-from datetime import datetime
 import json
+import warnings
+
+from .connection import get_connection
+from .constraints import constraints_service, read_change_token
+from .query_builder import (QueryBuilder, ReportQuery, ANALYSIS_COLUMNS,
+                            PREVIEW_COLUMNS, STAGE_COLUMNS)
+from .result_cache import result_cache
+from .topic_bridge import TopicBridge
+from .snapshot import snapshot_available, read_snapshot, read_manifest
 
 def make_db_connection():
-    conn = sqlite3.connect('new_cfmm_db.db')
-    return conn
+    """Return the pooled read-only connection of the calling thread
+
+    The connection is shared with later calls from the same thread, so it should not be closed.
+    """
+    return get_connection()
 
 def initialize_parameter_query():
-    conn = sqlite3.connect('new_cfmm_db.db')
-    cursor = conn.cursor()
-
-    # Generate list of publishers from database
-    pub_query = 'SELECT publisher FROM articles GROUP BY publisher'
-    publishers = [i[0] for i in cursor.execute(pub_query)]
-
-    # Generate list of dates
-    date_query = 'SELECT MIN(publish_date) min_date, MAX(publish_date) max_date FROM articles'
-    date_range = [i for i in cursor.execute(date_query)][0]
-
-    topic_query = 'SELECT DISTINCT(topic_name) FROM topic_list'
-    topics = [i[0] for i in cursor.execute(topic_query)]
-
-    query_constraints =  {
-        'publishers': publishers,
-        'topics': topics,
-        'date_range': [datetime.strptime(date_range[0], '%Y-%m-%d'), datetime.strptime(date_range[1], '%Y-%m-%d')]
-        }
-
-    conn.close()
-
-    return query_constraints
-
-def build_query(selected_publisher, start_date, end_date, compared_publishers, bias_category, topics, partial_query=False):
-    sql = f"""
-        SELECT a.article_id,
-               a.publish_date,
-               a.url,
-               a.publisher,
-               a.headline,
-               a.created_at,
-               a.location,
-               aa.negative_aspects_tag AS negative_aspects,
-               aa.negative_aspects AS negative_aspects_score,
-               aa.negative_aspects_analysis,
-               aa.generalization_tag AS generalisation,
-               aa.generalization AS generalisation_score,
-               aa.generalization_analysis AS generalisation_analysis,
-               aa.omit_due_prominence_tag AS omit_due_prominence,
-               aa.omit_due_prominence AS omit_due_prominence_score,
-               aa.omit_due_prominence_analysis,
-               aa.headline_bias_tag AS headline_bias,
-               aa.headline_bias AS headline_bias_score,
-               aa.headline_bias_analysis,
-               aa.misrepresentation_tag AS misrepresentation,
-               aa.misrepresentation AS misrepresentation_score,
-               aa.misrepresentation_analysis,
-               aa.is_current,
-               aa.bias_rating,
-               tl.topic
-        FROM articles a 
-        LEFT JOIN article_analyses aa on a.article_id = aa.article_id
-        """
-    
-    if len(topics) > 0:
-        topic_sql ="""
-        LEFT JOIN (
-            SELECT
-                article_id,
-                GROUP_CONCAT(topic_name, ' | ') AS topic
-            FROM topic_list
-        """
-        topic_sql += ' WHERE (' + ' OR '.join([f'topic_name LIKE "%{i}%"' for i in topics]) + ')'
-
-        topic_sql +="""
-            GROUP BY article_id
-        ) tl on a.article_id = tl.article_id
-        """
-        sql += topic_sql
-    
-    date_sql = f"WHERE (publish_date >= '{start_date}' AND publish_date <= '{end_date}')"
-    sql += date_sql
+    """Return the publishers, topics and date range that reports can be built for
+
+    Served from the process-wide constraints cache, see utils/constraints.py.
+    """
+    return constraints_service.get()
+
+def build_query(selected_publisher, start_date, end_date, compared_publishers, bias_category, topics, partial_query=False, columns=None):
+    """Build the parameterized report dataset query
 
+    Returns a ReportQuery holding the SQL and its bound parameters, to be passed to
+    execute_query_to_dataframe(). Pass columns to only select part of the dataset,
+    e.g. PREVIEW_COLUMNS.
+    """
     if partial_query:
         publishers = [selected_publisher]
     else:
         publishers = [selected_publisher] + compared_publishers
 
-    if len(publishers) > 0:
-        publisher_sql = ' AND (' + ' OR '.join([f"publisher LIKE '%{i}%'" for i in publishers]) + ')'
-        sql += publisher_sql
-
     # if len(bias_category) > 0:
     #     bias_col = {
     #         'Generalizing Claims': 'generalisation',
@@ -102,14 +47,110 @@ def build_query(selected_publisher, start_date, end_date, compared_publishers, b
     #     bias_sql = ' AND (' + ' OR '.join([f"{bias_col[i]} = 1" for i in bias_category]) + ')'
     #     sql += bias_sql
 
-    return sql
+    return QueryBuilder(columns).build(publishers, start_date, end_date, topics)
+
+def has_articles(selected_publisher, start_date, end_date):
+    """Check whether the publisher has any article in the date range"""
+    query = QueryBuilder().build_exists([selected_publisher], start_date, end_date)
+    row = get_connection().execute(query.sql, query.params).fetchone()
+    return row is not None
+
+# Bias category scores are loaded straight into ordered categoricals
+SCORE_DTYPE = pd.CategoricalDtype(categories=['NA', 'Very Low', 'Low', 'Medium', 'High', 'Very High'], ordered=True)
+SCORE_COLUMNS = ['negative_aspects_score', 'generalisation_score', 'omit_due_prominence_score',
+                 'headline_bias_score', 'misrepresentation_score']
+
+def _apply_dtypes(df, columns):
+    if 'publish_date' in columns:
+        df['publish_date'] = pd.to_datetime(df['publish_date'])
+    for column in SCORE_COLUMNS:
+        if column in columns:
+            df[column] = df[column].astype(SCORE_DTYPE)
+    return df
 
-def execute_query_to_dataframe(sql):
-    conn = sqlite3.connect('new_cfmm_db.db')
-    df = pd.read_sql_query(sql, conn)
-    conn.close()
+def _snapshot_current():
+    """Whether the snapshot was exported from the database as it is now"""
+    manifest = read_manifest()
+    try:
+        token = read_change_token(get_connection())
+    except FileNotFoundError:
+        # Only the snapshot is deployed, there is nothing to compare it with
+        return True
+
+    if manifest['source_token'] == token:
+        return True
+
+    # The default filter shows this once per snapshot, the message names its export time
+    warnings.warn(f"The snapshot exported at {manifest['exported_at']} does not match the database, "
+                  'report queries are read from SQLite until it is exported again (python -m utils.snapshot export).')
+    return False
+
+def _reads_snapshot(query):
+    return (isinstance(query, ReportQuery) and query.kind in ['report', 'topic_bridge']
+            and snapshot_available() and _snapshot_current())
+
+def _read_query(query):
+    if _reads_snapshot(query):
+        return _apply_dtypes(read_snapshot(query), query.columns)
+
+    conn = get_connection()
+    if isinstance(query, ReportQuery):
+        dtypes = {c: SCORE_DTYPE for c in SCORE_COLUMNS if c in query.columns}
+        parse_dates = ['publish_date'] if 'publish_date' in query.columns else None
+        df = pd.read_sql_query(query.sql, conn, params=query.params,
+                               parse_dates=parse_dates, dtype=dtypes or None)
+    else:
+        df = pd.read_sql_query(query, conn)
     return df
 
+def _data_token(query):
+    """Change token of the source the query will be read from"""
+    if _reads_snapshot(query):
+        return 'snapshot:' + read_manifest()['exported_at']
+    return read_change_token(get_connection())
+
+def execute_query_to_dataframe(query, use_cache=True):
+    """Run a query and return the results as a dataframe
+
+    Report queries are read from the Parquet snapshot when CFMM_SNAPSHOT_DIR is set
+    (see utils/snapshot.py) and the snapshot matches the database, and their results are cached per normalized selection and
+    data change token (see utils/result_cache.py).
+    """
+    if not use_cache or not isinstance(query, ReportQuery):
+        return _read_query(query)
+
+    return result_cache.get_or_load(query, _read_query, _data_token(query))
+
+def load_topic_bridge(query):
+    """Load the article -> topic bridge matching a report query from build_query()
+
+    The bridge lets the statistics count topics without splitting the ' | '-joined
+    topic strings of the report dataset.
+    """
+    bridge_query = QueryBuilder().build_topic_bridge(query.publishers, query.start_date, query.end_date, query.topics)
+    pairs = execute_query_to_dataframe(bridge_query)
+    return TopicBridge.from_pairs(pairs['article_id'].to_numpy(), pairs['topic_name'].to_numpy())
+
+def fetch_analysis_text(analysis_rowids, columns=ANALYSIS_COLUMNS):
+    """Fetch the long analysis text of the given analysis rows
+
+    Datasets loaded with the report stage projection leave out the analysis columns,
+    only the few articles selected as case studies need them.
+    """
+    query = QueryBuilder().build_analysis_lookup(analysis_rowids, columns)
+    return _read_query(query)
+
+def fetch_case_study_summaries(analysis_rowids, case_type):
+    """Fetch the precomputed case study summaries of the given analysis rows, with the article each is for
+
+    Returns None if the summary table has not been created yet (see utils/case_studies.py).
+    """
+    query = QueryBuilder().build_case_study_lookup(analysis_rowids, case_type)
+    try:
+        return _read_query(query)
+    except pd.errors.DatabaseError:
+        return None
+
 def export_query_params_to_json(selected_publisher, start_date, end_date, compared_publishers, bias_category, topics):
     query_params = {
         'selected_publisher': selected_publisher,
@@ -0,0 +1,208 @@
+import json
+
+# Output column name -> SQL expression, in the order the report dataset expects them
+REPORT_COLUMNS = {
+    'article_id': 'a.article_id',
+    'publish_date': 'a.publish_date',
+    'url': 'a.url',
+    'publisher': 'a.publisher',
+    'headline': 'a.headline',
+    'created_at': 'a.created_at',
+    'location': 'a.location',
+    'negative_aspects': 'aa.negative_aspects_tag',
+    'negative_aspects_score': 'aa.negative_aspects',
+    'negative_aspects_analysis': 'aa.negative_aspects_analysis',
+    'generalisation': 'aa.generalization_tag',
+    'generalisation_score': 'aa.generalization',
+    'generalisation_analysis': 'aa.generalization_analysis',
+    'omit_due_prominence': 'aa.omit_due_prominence_tag',
+    'omit_due_prominence_score': 'aa.omit_due_prominence',
+    'omit_due_prominence_analysis': 'aa.omit_due_prominence_analysis',
+    'headline_bias': 'aa.headline_bias_tag',
+    'headline_bias_score': 'aa.headline_bias',
+    'headline_bias_analysis': 'aa.headline_bias_analysis',
+    'misrepresentation': 'aa.misrepresentation_tag',
+    'misrepresentation_score': 'aa.misrepresentation',
+    'misrepresentation_analysis': 'aa.misrepresentation_analysis',
+    'is_current': 'aa.is_current',
+    'bias_rating': 'aa.bias_rating',
+    'topic': 'tl.topic',
+    # Identifies the analysis row, so its long text can be fetched later on demand
+    'analysis_rowid': 'aa.rowid',
+}
+
+# Long markdown analyses, only read for the handful of articles used as case studies
+ANALYSIS_COLUMNS = [c for c in REPORT_COLUMNS if c.endswith('_analysis')]
+
+# Full report dataset as returned by the original query
+DEFAULT_COLUMNS = [c for c in REPORT_COLUMNS if c != 'analysis_rowid']
+
+# Columns shown in the data preview table
+PREVIEW_COLUMNS = ['publish_date', 'publisher', 'headline']
+
+# Columns read by the statistics, charts and case study selection, analysis text is
+# fetched lazily for the selected case studies only
+REPORT_STAGE_COLUMNS = [c for c in REPORT_COLUMNS if c not in ANALYSIS_COLUMNS]
+
+STAGE_COLUMNS = {
+    'preview': PREVIEW_COLUMNS,
+    'report': REPORT_STAGE_COLUMNS,
+    'full': DEFAULT_COLUMNS
+}
+
+
+class ReportQuery:
+    """Parameterized SQL statement together with the selection it was built from"""
+
+    def __init__(self, sql, params, publishers, start_date, end_date, topics, columns, kind='report'):
+        self.kind = kind
+        self.sql = sql
+        self.params = params
+        self.publishers = publishers
+        self.start_date = start_date
+        self.end_date = end_date
+        self.topics = topics
+        self.columns = columns
+
+    def __repr__(self):
+        return f'ReportQuery(publishers={self.publishers}, start_date={self.start_date!r}, ' \
+               f'end_date={self.end_date!r}, topics={self.topics}, columns={len(self.columns)})'
+
+
+class QueryBuilder:
+    """Builds the report dataset query as a parameterized statement
+
+    Lists of publishers and topics are bound as a single JSON array and expanded with
+    json_each(), so the statement text only depends on which clauses are present and
+    not on the values selected. SQLite can then reuse the prepared statement (and its
+    query plan) from the connection's statement cache across report requests.
+    """
+
+    def __init__(self, columns=None):
+        if columns is None:
+            columns = DEFAULT_COLUMNS
+
+        unknown = [c for c in columns if c not in REPORT_COLUMNS]
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown report columns: {unknown}")
+
+        self.columns = columns
+
+    def __select_sql(self, include_topics):
+        select_list = []
+        for column in self.columns:
+            expression = REPORT_COLUMNS[column]
+
+            # Without a topic selection there is nothing to join the topic list from
+            if column == 'topic' and not include_topics:
+                expression = 'NULL'
+
+            if expression.split('.')[-1] == column:
+                select_list.append(expression)
+            else:
+                select_list.append(f'{expression} AS {column}')
+
+        return 'SELECT ' + ',\n               '.join(select_list)
+
+    def build(self, publishers, start_date, end_date, topics):
+        include_topics = len(topics) > 0 and 'topic' in self.columns
+        params = {
+            'start_date': start_date,
+            'end_date': end_date
+        }
+
+        sql = self.__select_sql(include_topics)
+        sql += """
+        FROM articles a
+        LEFT JOIN article_analyses aa on a.article_id = aa.article_id
+        """
+
+        if include_topics:
+            sql += """
+        LEFT JOIN (
+            SELECT
+                article_id,
+                GROUP_CONCAT(topic_name, ' | ') AS topic
+            FROM (
+                -- Topics are joined in name order, the same as the snapshot (see utils/snapshot.py)
+                SELECT article_id, topic_name
+                FROM topic_list
+                WHERE topic_name IN (SELECT value FROM json_each(:topics))
+                ORDER BY article_id, topic_name
+            )
+            GROUP BY article_id
+        ) tl on a.article_id = tl.article_id
+        """
+            params['topics'] = json.dumps(list(topics))
+
+        sql += "WHERE (a.publish_date >= :start_date AND a.publish_date <= :end_date)"
+
+        if len(publishers) > 0:
+            sql += " AND a.publisher IN (SELECT value FROM json_each(:publishers))"
+            params['publishers'] = json.dumps(list(publishers))
+
+        return ReportQuery(sql, params, list(publishers), start_date, end_date, list(topics), list(self.columns))
+
+    def build_exists(self, publishers, start_date, end_date):
+        """Probe for at least one article of the publishers in the date range
+
+        Equivalent to checking whether build() returns rows, as both joins are LEFT JOINs,
+        but stops at the first index hit.
+        """
+        params = {
+            'start_date': start_date,
+            'end_date': end_date,
+            'publishers': json.dumps(list(publishers))
+        }
+        sql = """SELECT 1
+        FROM articles a
+        WHERE (a.publish_date >= :start_date AND a.publish_date <= :end_date)
+          AND a.publisher IN (SELECT value FROM json_each(:publishers))
+        LIMIT 1"""
+
+        return ReportQuery(sql, params, list(publishers), start_date, end_date, [], [], kind='exists')
+
+    def build_topic_bridge(self, publishers, start_date, end_date, topics):
+        """Article -> topic pairs for the articles a build() query with the same selection returns"""
+        params = {
+            'start_date': start_date,
+            'end_date': end_date,
+            'topics': json.dumps(list(topics))
+        }
+        sql = """SELECT tl.article_id, a.publisher, tl.topic_name
+        FROM topic_list tl
+        JOIN articles a on a.article_id = tl.article_id
+        WHERE tl.topic_name IN (SELECT value FROM json_each(:topics))
+          AND (a.publish_date >= :start_date AND a.publish_date <= :end_date)"""
+
+        if len(publishers) > 0:
+            sql += " AND a.publisher IN (SELECT value FROM json_each(:publishers))"
+            params['publishers'] = json.dumps(list(publishers))
+
+        return ReportQuery(sql, params, list(publishers), start_date, end_date, list(topics),
+                           ['article_id', 'publisher', 'topic_name'], kind='topic_bridge')
+
+    def build_analysis_lookup(self, analysis_rowids, columns=ANALYSIS_COLUMNS):
+        """Fetch the analysis text of specific analysis rows"""
+        unknown = [c for c in columns if c not in ANALYSIS_COLUMNS]
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown analysis columns: {unknown}")
+
+        select_list = [f'{REPORT_COLUMNS[c]} AS {c}' for c in columns]
+        sql = 'SELECT aa.rowid AS analysis_rowid, ' + ', '.join(select_list) + """
+        FROM article_analyses aa
+        WHERE aa.rowid IN (SELECT value FROM json_each(:analysis_rowids))"""
+        params = {'analysis_rowids': json.dumps([int(i) for i in analysis_rowids])}
+
+        return ReportQuery(sql, params, [], None, None, [], ['analysis_rowid'] + list(columns), kind='analysis')
+
+    def build_case_study_lookup(self, analysis_rowids, case_type):
+        """Fetch the precomputed case study summaries of specific analysis rows"""
+        sql = """SELECT cs.analysis_rowid, cs.article_id, cs.summary AS case_study_summary
+        FROM case_study_summaries cs
+        WHERE cs.case_type = :case_type
+          AND cs.analysis_rowid IN (SELECT value FROM json_each(:analysis_rowids))"""
+        params = {'case_type': case_type, 'analysis_rowids': json.dumps([int(i) for i in analysis_rowids])}
+
+        return ReportQuery(sql, params, [], None, None, [], ['analysis_rowid', 'article_id', 'case_study_summary'],
+                           kind='case_study')
@@ -0,0 +1,215 @@
+"""Store of the briefing packs built so far
+
+Every pack built by the report page is recorded with its parameters, the
+ReportComponentFactory results, its chart artifacts and a reference to its PPTX in the
+report file store (see artifacts.py). The retriever pages list and reopen packs from
+here without running any query, statistics or LLM work again.
+
+Packs start as drafts and are published from the drafts page. The schema and input
+fingerprint of each component are kept as well, so a draft can be rebuilt changing
+only the components whose inputs differ (see briefbuilder/rebuild.py).
+
+    REPORT_STORE_PATH  SQLite file of the store (default reports/reports.db)
+"""
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from datetime import datetime
+
+from .artifacts import REPORT_DIR, MemoryArtifactStore
+
+REPORT_STORE_PATH = os.getenv('REPORT_STORE_PATH', os.path.join(REPORT_DIR, 'reports.db'))
+
+REPORT_STATUSES = ['draft', 'published']
+
+# Columns of the report listings, the results and artifacts are only read when a pack is opened
+LISTING_COLUMNS = ['report_id', 'publisher', 'compared_publishers', 'start_date', 'end_date',
+                   'status', 'pptx_ref', 'created_at', 'published_at']
+
+
+class ReportStore:
+    """Reports and their chart artifacts in a SQLite file, looked up by publisher and date range"""
+
+    def __init__(self, path=REPORT_STORE_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def __connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory != '':
+                os.makedirs(directory, exist_ok=True)
+
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA foreign_keys=ON')
+            with self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS reports (
+                        report_id TEXT PRIMARY KEY,
+                        publisher TEXT NOT NULL,
+                        compared_publishers TEXT,
+                        start_date TEXT NOT NULL,
+                        end_date TEXT NOT NULL,
+                        params TEXT NOT NULL,
+                        results TEXT NOT NULL,
+                        components TEXT,
+                        pptx_ref TEXT,
+                        status TEXT NOT NULL,
+                        created_at TEXT NOT NULL,
+                        published_at TEXT
+                    )""")
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS report_artifacts (
+                        report_id TEXT NOT NULL REFERENCES reports (report_id) ON DELETE CASCADE,
+                        name TEXT NOT NULL,
+                        data BLOB NOT NULL,
+                        PRIMARY KEY (report_id, name)
+                    )""")
+                # Stores created before component states were kept
+                columns = [row[1] for row in self._conn.execute('PRAGMA table_info(reports)')]
+                if 'components' not in columns:
+                    self._conn.execute('ALTER TABLE reports ADD COLUMN components TEXT')
+                # Publisher followed by a date range, the lookup of the retriever pages
+                self._conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_publisher_start_date '
+                                   'ON reports (publisher, start_date, end_date)')
+                # Latest drafts or published reports of every publisher
+                self._conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_status_created_at '
+                                   'ON reports (status, created_at)')
+        return self._conn
+
+    def __row_to_dict(self, row):
+        report = dict(zip(LISTING_COLUMNS, row))
+        report['compared_publishers'] = json.loads(report['compared_publishers'])
+        return report
+
+    def save(self, params, results, artifact_store=None, pptx_ref=None, status='draft', components=None):
+        """Record a pack built from params (see export_query_params_to_json), returns its report_id
+
+        components are the component_states of the ReportComponentFactory that built it.
+        """
+        if status not in REPORT_STATUSES:
+            raise ValueError(f'status must be one of {REPORT_STATUSES}, got {status!r}')
+
+        report_id = uuid.uuid4().hex
+        now = datetime.now().isoformat(timespec='seconds')
+        artifacts = []
+        if artifact_store is not None:
+            artifacts = [(report_id, name, artifact_store.get(name)) for name in artifact_store.names()]
+
+        with self._lock:
+            conn = self.__connect()
+            with conn:
+                conn.execute(
+                    'INSERT INTO reports (report_id, publisher, compared_publishers, start_date, end_date, params, results, '
+                    'components, pptx_ref, status, created_at, published_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (report_id, params['selected_publisher'], json.dumps(params['compared_publishers']),
+                     params['start_date'], params['end_date'], json.dumps(params), json.dumps(results),
+                     None if components is None else json.dumps(components),
+                     pptx_ref, status, now, now if status == 'published' else None)
+                )
+                conn.executemany('INSERT INTO report_artifacts (report_id, name, data) VALUES (?, ?, ?)', artifacts)
+
+        return report_id
+
+    def find(self, publisher=None, start_date=None, end_date=None, status=None):
+        """Reports of the publisher covering part of the date range, latest first
+
+        Every argument left as None matches all reports.
+        """
+        conditions = []
+        values = []
+        if publisher is not None:
+            conditions.append('publisher = ?')
+            values.append(publisher)
+        if end_date is not None:
+            conditions.append('start_date <= ?')
+            values.append(end_date)
+        if start_date is not None:
+            conditions.append('end_date >= ?')
+            values.append(start_date)
+        if status is not None:
+            conditions.append('status = ?')
+            values.append(status)
+
+        sql = 'SELECT ' + ', '.join(LISTING_COLUMNS) + ' FROM reports'
+        if len(conditions) > 0:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY created_at DESC'
+
+        with self._lock:
+            rows = self.__connect().execute(sql, values).fetchall()
+        return [self.__row_to_dict(row) for row in rows]
+
+    def publishers(self, status=None):
+        """Publishers with at least one report"""
+        sql = 'SELECT DISTINCT publisher FROM reports'
+        values = []
+        if status is not None:
+            sql += ' WHERE status = ?'
+            values.append(status)
+
+        with self._lock:
+            rows = self.__connect().execute(sql + ' ORDER BY publisher', values).fetchall()
+        return [row[0] for row in rows]
+
+    def get(self, report_id):
+        """Listing of the report together with its params, results and component states"""
+        with self._lock:
+            row = self.__connect().execute(
+                'SELECT ' + ', '.join(LISTING_COLUMNS) + ', params, results, components FROM reports WHERE report_id = ?',
+                (report_id,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f'No report {report_id!r}')
+
+        report = self.__row_to_dict(row[:len(LISTING_COLUMNS)])
+        report['params'] = json.loads(row[-3])
+        report['results'] = json.loads(row[-2])
+        report['components'] = None if row[-1] is None else json.loads(row[-1])
+        return report
+
+    def artifact_store(self, report_id):
+        """Artifact store holding the chart artifacts of the report"""
+        store = MemoryArtifactStore()
+        with self._lock:
+            for name, data in self.__connect().execute(
+                'SELECT name, data FROM report_artifacts WHERE report_id = ?', (report_id,)
+            ):
+                store.put(name, data)
+        return store
+
+    def set_pptx_ref(self, report_id, pptx_ref):
+        with self._lock:
+            conn = self.__connect()
+            with conn:
+                conn.execute('UPDATE reports SET pptx_ref = ? WHERE report_id = ?', (pptx_ref, report_id))
+
+    def publish(self, report_id):
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            conn = self.__connect()
+            with conn:
+                conn.execute("UPDATE reports SET status = 'published', published_at = ? WHERE report_id = ?",
+                             (now, report_id))
+
+    def delete(self, report_id):
+        """Forget the report and its artifacts, returns the reference of its PPTX for the caller to remove"""
+        with self._lock:
+            conn = self.__connect()
+            with conn:
+                row = conn.execute('SELECT pptx_ref FROM reports WHERE report_id = ?', (report_id,)).fetchone()
+                conn.execute('DELETE FROM reports WHERE report_id = ?', (report_id,))
+        return None if row is None else row[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+report_store = ReportStore()
@@ -0,0 +1,191 @@
+"""In-process cache of report datasets keyed by the normalized report selection
+
+A report dataset only depends on the set of publishers it covers, the date range, the
+topic selection and the state of the database. Selected and compared publishers are
+therefore pooled into one sorted set, so "Bbc vs Guardian" and "Guardian vs Bbc" share
+an entry, and a request whose publishers are a subset of a cached request is served by
+filtering the cached frame instead of running the query again.
+
+Entries are keyed by the data change token they were loaded under, once the token
+moves (see utils/constraints.py) all older entries are dropped, spilled ones included.
+"""
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+RESULT_CACHE_MB = int(os.getenv('CFMM_RESULT_CACHE_MB', 512))
+RESULT_CACHE_DIR = os.getenv('CFMM_RESULT_CACHE_DIR')
+RESULT_CACHE_SPILL_MB = int(os.getenv('CFMM_RESULT_CACHE_SPILL_MB', 2048))
+
+
+def canonical_selection(query, token=None):
+    """Selection of a ReportQuery with list order and duplicates normalized away"""
+    return {
+        'publishers': sorted(set(query.publishers)),
+        'start_date': str(query.start_date),
+        'end_date': str(query.end_date),
+        'topics': sorted(set(query.topics)),
+        'columns': list(query.columns),
+        'token': token
+    }
+
+
+def hash_selection(selection):
+    return hashlib.sha256(json.dumps(selection, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class CacheEntry:
+
+    def __init__(self, key, family, publishers, token, df=None, spill_path=None):
+        self.key = key
+        self.family = family
+        self.publishers = set(publishers)
+        self.token = token
+        self.df = df
+        self.spill_path = spill_path
+        self.spill_nbytes = 0
+        self.nbytes = int(df.memory_usage(deep=True).sum()) if df is not None else 0
+
+
+class QueryResultCache:
+    """LRU cache of query results bounded by memory, with optional Parquet spill
+
+    Entries evicted from memory are written to spill_dir (if given) and read back on
+    the next hit instead of rerunning the query. Spilled entries beyond max_spill_bytes
+    are deleted, oldest spill first.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_MB * 1024 * 1024, spill_dir=RESULT_CACHE_DIR,
+                 max_spill_bytes=RESULT_CACHE_SPILL_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self._entries = OrderedDict()
+        self._spilled = OrderedDict()
+        self._nbytes = 0
+        self._spill_nbytes = 0
+        self._token = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.spill_dir is not None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    def __keys(self, query, token):
+        selection = canonical_selection(query, token)
+        key = hash_selection(selection)
+
+        # Everything but the publishers, entries of one family can serve each other's subsets
+        selection.pop('publishers')
+        family = hash_selection(selection)
+        return key, family, set(query.publishers)
+
+    def __find(self, key, family, publishers):
+        """Return a cached entry covering the request, most specific first"""
+        if key in self._entries:
+            return self._entries[key]
+        if key in self._spilled:
+            return self._spilled[key]
+
+        candidates = [e for e in list(self._entries.values()) + list(self._spilled.values())
+                      if e.family == family and publishers <= e.publishers]
+        if len(candidates) == 0:
+            return None
+        return min(candidates, key=lambda e: len(e.publishers))
+
+    def __remove_spilled(self, key):
+        entry = self._spilled.pop(key)
+        self._spill_nbytes -= entry.spill_nbytes
+        if os.path.exists(entry.spill_path):
+            os.remove(entry.spill_path)
+        return entry
+
+    def __drop_stale(self, token):
+        """Forget the entries loaded under another change token than the current one"""
+        if token == self._token:
+            return
+        for key in [k for k, e in self._entries.items() if e.token != token]:
+            self._nbytes -= self._entries.pop(key).nbytes
+        for key in [k for k, e in self._spilled.items() if e.token != token]:
+            self.__remove_spilled(key)
+        self._token = token
+
+    def __evict(self):
+        while self._nbytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._nbytes -= entry.nbytes
+
+            if self.spill_dir is not None:
+                entry.spill_path = os.path.join(self.spill_dir, f'{entry.key}.parquet')
+                entry.df.to_parquet(entry.spill_path, index=False)
+                entry.df = None
+                entry.spill_nbytes = os.path.getsize(entry.spill_path)
+                self._spilled[entry.key] = entry
+                self._spill_nbytes += entry.spill_nbytes
+
+        while self._spill_nbytes > self.max_spill_bytes and len(self._spilled) > 0:
+            self.__remove_spilled(next(iter(self._spilled)))
+
+    def __insert(self, entry):
+        self._entries[entry.key] = entry
+        self._nbytes += entry.nbytes
+        self.__evict()
+
+    def get(self, query, token=None):
+        key, family, publishers = self.__keys(query, token)
+
+        with self._lock:
+            self.__drop_stale(token)
+            entry = self.__find(key, family, publishers)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.df is None:
+                # Promote a spilled entry back into memory
+                df = pd.read_parquet(entry.spill_path)
+                self.__remove_spilled(entry.key)
+                entry = CacheEntry(entry.key, entry.family, entry.publishers, entry.token, df)
+                self.__insert(entry)
+
+            self._entries.move_to_end(entry.key)
+            self.hits += 1
+            df = entry.df
+
+        if entry.publishers != publishers:
+            df = df[df['publisher'].isin(publishers)].reset_index(drop=True)
+
+        # Report code assigns columns on the frame it is given, keep the cached frame intact
+        return df.copy()
+
+    def put(self, query, df, token=None):
+        key, family, publishers = self.__keys(query, token)
+
+        with self._lock:
+            self.__drop_stale(token)
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key).nbytes
+            self.__insert(CacheEntry(key, family, publishers, token, df.copy()))
+
+    def get_or_load(self, query, loader, token=None):
+        df = self.get(query, token)
+        if df is None:
+            df = loader(query)
+            self.put(query, df, token)
+        return df
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._spilled.keys()):
+                self.__remove_spilled(key)
+            self._entries = OrderedDict()
+            self._nbytes = 0
+            self._token = None
+
+
+result_cache = QueryResultCache()
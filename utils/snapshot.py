@@ -0,0 +1,190 @@
+"""Columnar snapshot of the report dataset
+
+Materializes the articles + article_analyses + topic_list join into a Parquet dataset
+partitioned by publisher and publication month:
+
+    python -m utils.snapshot export --out snapshot/ [--db new_cfmm_db.db]
+
+When CFMM_SNAPSHOT_DIR points at such a dataset, execute_query_to_dataframe() reads
+report queries from it instead of joining in SQLite. Publisher and date filters are
+pushed down to the partition and row-group level, so only the matching files and
+columns are read.
+"""
+import os
+import json
+import shutil
+import argparse
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from .connection import DB_PATH, ConnectionPool
+from .constraints import read_change_token
+from .query_builder import REPORT_COLUMNS
+
+SNAPSHOT_DIR = os.getenv('CFMM_SNAPSHOT_DIR')
+MANIFEST_FILE = '_manifest.json'
+EXPORT_CHUNK_ROWS = 200000
+
+# Every report column except the filtered topic string, which is rebuilt at read time
+# from the full per-article topic list
+SNAPSHOT_COLUMNS = [c for c in REPORT_COLUMNS if c != 'topic']
+PARTITIONING = ds.partitioning(pa.schema([('publisher', pa.string()), ('month', pa.string())]), flavor='hive')
+
+INTEGER_COLUMNS = ['article_id', 'negative_aspects', 'generalisation', 'omit_due_prominence', 'headline_bias',
+                   'misrepresentation', 'is_current', 'bias_rating', 'analysis_rowid']
+
+# Fixed schema, so that chunks with all-null or null-free columns still write identical files
+SNAPSHOT_SCHEMA = pa.schema(
+    [(c, pa.int64() if c in INTEGER_COLUMNS else pa.string()) for c in SNAPSHOT_COLUMNS]
+    + [('month', pa.string()), ('topics', pa.list_(pa.string()))]
+)
+
+
+def snapshot_available(snapshot_dir=SNAPSHOT_DIR):
+    return snapshot_dir is not None and os.path.exists(os.path.join(snapshot_dir, MANIFEST_FILE))
+
+
+def read_manifest(snapshot_dir=SNAPSHOT_DIR):
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE), 'r') as f:
+        return json.load(f)
+
+
+def _export_sql():
+    select_list = [f'{REPORT_COLUMNS[c]} AS {c}' for c in SNAPSHOT_COLUMNS]
+    return 'SELECT ' + ', '.join(select_list) + """, SUBSTR(a.publish_date, 1, 7) AS month
+        FROM articles a
+        LEFT JOIN article_analyses aa on a.article_id = aa.article_id
+        ORDER BY a.publisher, a.publish_date"""
+
+
+def _attach_topic_lists(conn, df):
+    article_ids = json.dumps([int(i) for i in df['article_id'].unique()])
+    topics = pd.read_sql_query("""
+        SELECT article_id, topic_name
+        FROM topic_list
+        WHERE article_id IN (SELECT value FROM json_each(:article_ids))
+        ORDER BY article_id, rowid
+        """, conn, params={'article_ids': article_ids})
+    topic_lists = topics.groupby('article_id')['topic_name'].agg(list)
+
+    df['topics'] = df['article_id'].map(topic_lists)
+    df['topics'] = df['topics'].apply(lambda x: x if isinstance(x, list) else [])
+    return df
+
+
+def export_snapshot(out_dir, db_path=DB_PATH, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write the joined report dataset as a hive-partitioned Parquet dataset
+
+    The snapshot is written to a staging directory first and swapped in once complete,
+    so readers never see a half-written snapshot.
+    """
+    if os.path.exists(out_dir) and len(os.listdir(out_dir)) > 0 and not snapshot_available(out_dir):
+        raise ValueError(f'{out_dir} is not empty and does not contain a snapshot, refusing to overwrite it')
+
+    staging_dir = out_dir.rstrip('/\\') + '.staging'
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+
+    conn = ConnectionPool(db_path).connect()
+    token = read_change_token(conn)
+
+    row_count = 0
+    for n, chunk in enumerate(pd.read_sql_query(_export_sql(), conn, chunksize=chunk_rows)):
+        chunk = _attach_topic_lists(conn, chunk)
+        table = pa.Table.from_pandas(chunk, schema=SNAPSHOT_SCHEMA, preserve_index=False)
+        ds.write_dataset(
+            table,
+            staging_dir,
+            format='parquet',
+            partitioning=PARTITIONING,
+            basename_template=f'part-{n}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore'
+        )
+        row_count += len(chunk)
+
+    conn.close()
+
+    manifest = {
+        'exported_at': datetime.now().isoformat(timespec='seconds'),
+        'source_db': os.path.abspath(db_path),
+        'source_token': token,
+        'rows': row_count
+    }
+    os.makedirs(staging_dir, exist_ok=True)
+    with open(os.path.join(staging_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.rename(staging_dir, out_dir)
+
+    return manifest
+
+
+def _month(date):
+    return str(date)[:7]
+
+
+def read_snapshot(query, snapshot_dir=SNAPSHOT_DIR):
+    """Read a report or topic bridge ReportQuery from the snapshot
+
+    Returns the same columns and rows as running the query against the database.
+    """
+    dataset = ds.dataset(snapshot_dir, format='parquet', partitioning=PARTITIONING)
+
+    # Month partitions prune whole directories, publish_date prunes row groups
+    expression = ((ds.field('month') >= _month(query.start_date))
+                  & (ds.field('month') <= _month(query.end_date))
+                  & (ds.field('publish_date') >= str(query.start_date))
+                  & (ds.field('publish_date') <= str(query.end_date)))
+    if len(query.publishers) > 0:
+        expression = expression & ds.field('publisher').isin(list(query.publishers))
+
+    if query.kind == 'topic_bridge':
+        return _read_topic_pairs(dataset, expression, query.topics)
+
+    columns = [c for c in query.columns if c != 'topic']
+    if 'topic' in query.columns:
+        columns.append('topics')
+
+    df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+    if 'topic' in query.columns:
+        df['topic'] = _filter_topics(df.pop('topics'), query.topics)
+
+    return df[list(query.columns)]
+
+
+def _read_topic_pairs(dataset, expression, topics):
+    """Article -> topic pairs of the selected topics, as returned by the topic bridge query"""
+    df = dataset.to_table(columns=['article_id', 'publisher', 'topics'], filter=expression).to_pandas()
+    df = df.drop_duplicates('article_id').explode('topics').rename(columns={'topics': 'topic_name'})
+    df = df[df['topic_name'].isin(topics)].reset_index(drop=True)
+    return df
+
+
+def _filter_topics(topic_lists, topics):
+    """Rebuild the GROUP_CONCAT of the selected topics for every row, in topic name order like the query"""
+    if len(topics) == 0:
+        return pd.Series(None, index=topic_lists.index, dtype=object)
+
+    exploded = topic_lists.explode()
+    exploded = exploded[exploded.isin(topics)].sort_values(kind='stable')
+    joined = exploded.groupby(level=0).agg(' | '.join)
+    return joined.reindex(topic_lists.index)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the CfMM report dataset to a Parquet snapshot')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help='Export the database to a snapshot directory')
+    export_parser.add_argument('--out', default=SNAPSHOT_DIR, required=SNAPSHOT_DIR is None,
+                               help='Snapshot directory (defaults to CFMM_SNAPSHOT_DIR)')
+    export_parser.add_argument('--db', default=DB_PATH, help='Path to the SQLite database')
+    args = parser.parse_args()
+
+    manifest = export_snapshot(args.out, args.db)
+    print(f"Exported {manifest['rows']} rows to {args.out}")
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+
+class TopicBridge:
+    """Normalized article -> topic pairs with integer-coded topics
+
+    One entry per (article_id, topic) pair of the report selection. Topic labels are
+    stored once in `topics` (sorted), the pairs only hold integer codes into it, so
+    topic counts reduce to bincounts over `topic_codes`.
+    """
+
+    def __init__(self, article_ids, topic_codes, topics):
+        self.article_ids = np.asarray(article_ids, dtype=np.int64)
+        self.topic_codes = np.asarray(topic_codes, dtype=np.int64)
+        self.topics = list(topics)
+
+    def __len__(self):
+        return len(self.article_ids)
+
+    def __repr__(self):
+        return f'TopicBridge(pairs={len(self)}, topics={len(self.topics)})'
+
+    @classmethod
+    def from_pairs(cls, article_ids, topic_names):
+        """Build from parallel sequences of article ids and topic names"""
+        topic_codes, topics = pd.factorize(pd.Series(topic_names, dtype=object), sort=True)
+        return cls(article_ids, topic_codes, topics)
+
+    @classmethod
+    def from_topic_column(cls, query_data):
+        """Build from the ' | '-joined topic column of a report dataset
+
+        Fallback for datasets that were loaded without a bridge, the split is done once
+        for the whole dataset.
+        """
+        articles = query_data[['article_id', 'topic']].drop_duplicates('article_id').dropna()
+        if len(articles) == 0:
+            return cls([], [], [])
+
+        pairs = articles.assign(topic=articles['topic'].str.split(' | ', regex=False)).explode('topic')
+        return cls.from_pairs(pairs['article_id'].to_numpy(), pairs['topic'].to_numpy())
+
+    def labels(self):
+        """Topic label of every pair"""
+        return np.asarray(self.topics, dtype=object)[self.topic_codes]
+
+    def pairs(self):
+        """Pairs as a dataframe with article_id and topic columns"""
+        return pd.DataFrame({'article_id': self.article_ids, 'topic': self.labels()})
+
+    def counts(self, article_weights):
+        """Number of rows per topic, given the number of rows of each article
+
+        article_weights is a Series indexed by article_id, articles missing from it are
+        not counted.
+        """
+        weights = pd.Series(article_weights).reindex(self.article_ids).fillna(0).to_numpy()
+        return np.bincount(self.topic_codes, weights=weights, minlength=len(self.topics)).astype(np.int64)